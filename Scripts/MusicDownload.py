@@ -2,8 +2,15 @@ import asyncio
 import aiofiles
 import os
 import shutil
-from yt_dlp import YoutubeDL
-from mutagen.id3 import ID3, COMM, APIC, TPE1, ID3NoHeaderError
+from tagging import write_song_tags
+from download_queue import DownloadQueue, MAX_ATTEMPTS, PENDING, RESOLVING, DOWNLOADING, CONVERTING, TAGGING, DONE, FAILED
+from library_catalog import LibraryCatalog, default_data_dir, video_id_from_url
+from ytdl_pool import YDL_POOL, SEARCH_OPTS, METADATA_OPTS, download_opts
+from thumbnails import ThumbnailFetcher
+from youtube_lists import is_collection_url, expand_collection, queue_videos
+from metadata_cache import MetadataCache, search_key, video_key, slim_info, SEARCH_TTL, INFO_TTL
+import download_pipeline
+from download_pipeline import Governor, Pipeline, Stage, extract_audio, downloaded_path
 
 # Load .env
 def load_env():
@@ -26,6 +33,22 @@ TEMP_DIR = os.environ['TEMP_DIR']
 PLAYLISTS_DIR = os.environ['PLAYLISTS_DIR']
 ALL_SONGS = os.environ['ALL_SONGS']
 MAX_CONCURRENT = 10
+RESOLVE_CONCURRENCY = 8   # songs.txt title lookups / searches running at once ahead of the prompts
+
+# Pipeline stage sizes: parallel downloads, parallel ffmpeg conversions (tagging is always one at a time)
+DOWNLOAD_WORKERS = int(os.environ.get('DOWNLOAD_WORKERS', MAX_CONCURRENT))
+TRANSCODE_WORKERS = int(os.environ.get('TRANSCODE_WORKERS', download_pipeline.TRANSCODE_WORKERS))
+# Let the download limit follow throughput / rate limiting / transcode backlog
+ADAPTIVE_DOWNLOADS = os.environ.get('ADAPTIVE_DOWNLOADS', '').lower() in ('1', 'true', 'yes')
+# Keep YouTube's own audio stream (opus remuxed into .opus, m4a as is) instead of re-encoding to mp3
+PASSTHROUGH_AUDIO = os.environ.get('PASSTHROUGH_AUDIO', '').lower() in ('1', 'true', 'yes')
+AUDIO_CODEC = download_pipeline.PASSTHROUGH_CODEC if PASSTHROUGH_AUDIO else "mp3"
+
+# Songs and their source video ids (read from the tags) for the downloaded-video archive
+CATALOG = LibraryCatalog(default_data_dir(PLAYLISTS_DIR) / "library.db", PLAYLISTS_DIR, [ALL_SONGS, TEMP_DIR])
+QUEUE = DownloadQueue(default_data_dir(PLAYLISTS_DIR) / "downloads.db")
+META_CACHE = MetadataCache(default_data_dir(PLAYLISTS_DIR) / "metadata.db")
+THUMBNAILS = ThumbnailFetcher(default_data_dir(PLAYLISTS_DIR) / "thumbnails")
 
 # ------------------------
 # Helpers
@@ -33,19 +56,30 @@ MAX_CONCURRENT = 10
 async def async_input(prompt: str = "") -> str:
     return await asyncio.to_thread(input, prompt)
 
-def run_download(ydl_opts, url):
-    """Run yt-dlp synchronously (executed inside an executor). Return the info dict."""
-    with YoutubeDL(ydl_opts) as ydl:
+def run_download(ydl_opts, url, progress_hooks=()):
+    """Run yt-dlp synchronously (on a download worker) with a pooled instance. Return the info dict."""
+    with YDL_POOL.checkout(ydl_opts, progress_hooks=progress_hooks) as ydl:
+        # info resolved moments ago (title lookup / batch preview) skips a second extraction
+        cached = META_CACHE.get(video_key(url), INFO_TTL)
+        if cached is not None:
+            try:
+                return ydl.process_ie_result(cached, download=True)
+            except Exception:
+                pass  # e.g. its stream URLs expired; extract again below
         info = ydl.extract_info(url, download=True)
         return info
 
-def download_thumbnail(url):
-    """Download thumbnail image data and mime type from URL."""
-    import urllib.request
-    with urllib.request.urlopen(url) as response:
-        data = response.read()
-        mime = response.headers.get('content-type', 'image/jpeg')
-        return data, mime
+def downloaded_song(url):
+    """Path of the library song already downloaded from this video (downloaded-video archive), or None."""
+    video_id = video_id_from_url(url)
+    if not video_id:
+        return None
+    CATALOG.refresh()
+    path = CATALOG.find_downloaded(video_id)
+    return str(path) if path else None
+
+def in_dir(path, folder):
+    return os.path.normcase(os.path.dirname(os.path.abspath(path))) == os.path.normcase(os.path.abspath(folder))
 
 def find_downloaded_file_from_info(info):
     """Try to locate the final file in TEMP_DIR using info dict returned by yt-dlp."""
@@ -68,136 +102,147 @@ def find_downloaded_file_from_info(info):
 
     return None
 
-def tag_song_with_playlists(song_path: str, playlists: list[str], thumbnail_data=None, mime=None, uploader=None):
+def tag_song_with_playlists(song_path: str, playlists: list[str], thumbnail_data=None, mime=None, uploader=None,
+                            title=None, source_url=None):
     """
-    Writes all playlist names into the comment field of the MP3, embeds thumbnail, and sets artist.
+    Writes all playlist names into the comment field of the song, embeds thumbnail, and sets artist,
+    title and source URL, all in one save.
     """
     comment_text = ", ".join(playlists)
-
-    try:
-        tags = ID3(song_path)
-    except ID3NoHeaderError:
-        tags = ID3()  # create new ID3 tag block if missing
-
-    tags.delall("COMM")  # remove old comments
-    tags.add(COMM(encoding=3, lang="eng", desc="", text=comment_text))
-
-    if thumbnail_data:
-        tags.add(APIC(encoding=3, mime=mime or 'image/jpeg', type=3, desc='Cover', data=thumbnail_data))
-
-    if uploader:
-        tags.add(TPE1(encoding=3, text=uploader))
-
-    # Save in ID3v2.3 (most compatible with Explorer/Foobar)
-    tags.save(song_path, v2_version=3)
-
-    print(f"✅ {os.path.basename(song_path)} → {comment_text}")
+    if write_song_tags(song_path, playlists, thumbnail_data, mime, uploader, title, source_url):
+        print(f"✅ {os.path.basename(song_path)} → {comment_text}")
+    else:
+        print(f"✅ {os.path.basename(song_path)} already tagged → {comment_text}")
 
 # ------------------------
-# Core: download -> (maybe move) -> update playlists -> remove from songs.txt
+# Core pipeline: download (network) -> transcode (ffmpeg) -> write (move, playlists, tags)
+# Each stage gets a queue job context and returns it for the next stage, or None once it failed.
 # ------------------------
-async def download_song(entry, playlist_names):
+def fetch_stage(ctx):
+    entry = ctx["entry"]
     url = entry["url"]
-    original_input = entry.get("input", url)
+    job_id = entry["id"]
     print(f"🔹 Starting download: {url}", flush=True)
 
-    ydl_opts = {
-        "outtmpl": os.path.join(TEMP_DIR, "%(title)s.%(ext)s"),
-        "quiet": True,
-        "no_warnings": True,
-        "noprogress": True,
-        "postprocessors": [{
-            "key": "FFmpegExtractAudio",
-            "preferredcodec": "mp3",
-        }],
-    }
+    # Cover art starts downloading as soon as yt-dlp knows the video's info, alongside the audio
+    thumbnail = {}
+    def on_progress(d):
+        thumbnail_url = (d.get("info_dict") or {}).get("thumbnail")
+        if thumbnail_url and "future" not in thumbnail:
+            thumbnail["future"] = THUMBNAILS.prefetch(thumbnail_url)
 
-    loop = asyncio.get_running_loop()
     try:
-        info = await loop.run_in_executor(None, run_download, ydl_opts, url)
+        info = run_download(download_opts(TEMP_DIR, "%(title)s.%(ext)s"), url, [on_progress])
     except Exception as e:
         print(f"⚠️ Download failed for {url}: {e}", flush=True)
-        return
-
-    # Download thumbnail
-    thumbnail_data = None
-    mime = None
-    if thumbnail_url := info.get('thumbnail'):
-        try:
-            thumbnail_data, mime = await asyncio.to_thread(download_thumbnail, thumbnail_url)
-        except Exception as e:
-            print(f"⚠️ Failed to download thumbnail: {e}", flush=True)
+        GOVERNOR.record_error(str(e))
+        QUEUE.set_state(job_id, FAILED, error=str(e))
+        return None
 
-    uploader = info.get('uploader')
-
-    src = find_downloaded_file_from_info(info)
+    src = downloaded_path(info) or find_downloaded_file_from_info(info)
     if not src:
         print("⚠️ Could not locate downloaded file in TempDownloads.", flush=True)
-        return
-
+        QUEUE.set_state(job_id, FAILED, error="downloaded file not found")
+        return None
+    GOVERNOR.record(os.path.getsize(src))
+
+    if "future" not in thumbnail and info.get('thumbnail'):
+        thumbnail["future"] = THUMBNAILS.prefetch(info['thumbnail'])
+    ctx.update(info=info, src=src, thumbnail=thumbnail.get("future"))
+    return ctx
+
+def transcode_stage(ctx):
+    job_id = ctx["entry"]["id"]
+    QUEUE.set_state(job_id, CONVERTING)
+    src = ctx["src"]
+    try:
+        ctx["src"] = extract_audio(dict(ctx["info"], filepath=src, ext=os.path.splitext(src)[1][1:]), AUDIO_CODEC)
+    except Exception as e:
+        print(f"⚠️ Audio conversion failed for {os.path.basename(src)}: {e}", flush=True)
+        QUEUE.set_state(job_id, FAILED, error=str(e))
+        return None
+    return ctx
+
+def write_stage(ctx):
+    job_id = ctx["entry"]["id"]
+    playlist_names = ctx["playlists"]
+    src = ctx["src"]
     dst = src  # default: stays in TempDownloads
+    existing = ctx.get("existing", False)  # already in the library, nothing was downloaded
 
     if playlist_names:  # move into AllSongs if playlists were chosen
         os.makedirs(ALL_SONGS, exist_ok=True)
 
-        base = os.path.basename(src)
-        name_no_ext, ext = os.path.splitext(base)
-        dst = os.path.join(ALL_SONGS, base)
-        i = 2
-        while os.path.exists(dst):
-            dst = os.path.join(ALL_SONGS, f"{name_no_ext} ({i}){ext}")
-            i += 1
+        if not in_dir(src, ALL_SONGS):   # a reused or resumed song may already be there
+            base = os.path.basename(src)
+            name_no_ext, ext = os.path.splitext(base)
+            dst = os.path.join(ALL_SONGS, base)
+            i = 2
+            while os.path.exists(dst):
+                dst = os.path.join(ALL_SONGS, f"{name_no_ext} ({i}){ext}")
+                i += 1
 
-        try:
-            await asyncio.to_thread(shutil.move, src, dst)
-            print(f"➡️  Moved {os.path.basename(dst)} into AllSongs", flush=True)
-        except Exception as e:
-            print(f"⚠️ Error moving file into AllSongs: {e}", flush=True)
-            return
+            try:
+                shutil.move(src, dst)
+                print(f"➡️  Moved {os.path.basename(dst)} into AllSongs", flush=True)
+            except Exception as e:
+                print(f"⚠️ Error moving file into AllSongs: {e}", flush=True)
+                QUEUE.set_state(job_id, FAILED, error=str(e))
+                return None
+            if existing:
+                CATALOG.song_moved(src, dst)
 
         # Add to *each* chosen playlist
+        rel = os.path.relpath(dst, PLAYLISTS_DIR).replace("\\", "/")
+        member_of = []
+        if existing or dst == src:   # already in the library: skip the playlists it is in
+            CATALOG.refresh()
+            member_of = CATALOG.playlists_for(rel)
         for pl in playlist_names:
             pl_path = os.path.join(PLAYLISTS_DIR, f"{pl}.m3u")
-            rel = os.path.relpath(dst, PLAYLISTS_DIR).replace("\\", "/")
 
             try:
                 if not os.path.exists(pl_path):
-                    async with aiofiles.open(pl_path, "w", encoding="utf-8") as f:
-                        await f.write("#EXTM3U\n")
+                    with open(pl_path, "w", encoding="utf-8") as f:
+                        f.write("#EXTM3U\n")
+                elif pl in member_of:
+                    print(f"🎵 {os.path.basename(dst)} is already in {pl}.m3u", flush=True)
+                    continue
                 # Append the entry
-                async with aiofiles.open(pl_path, "a", encoding="utf-8") as f:
-                    await f.write('\n' + rel)
+                with open(pl_path, "a", encoding="utf-8") as f:
+                    f.write('\n' + rel)
                 print(f"🎵 Added {os.path.basename(dst)} to {pl}.m3u", flush=True)
             except Exception as e:
                 print(f"⚠️ Error adding to playlist {pl}: {e}", flush=True)
 
-        # Tag MP3 with playlist information
-        tag_song_with_playlists(dst, playlist_names, thumbnail_data, mime, uploader)
-
-    # Tag MP3 even if no playlists selected (for TempDownloads)
-    if not playlist_names:
-        tag_song_with_playlists(dst, [], thumbnail_data, mime, uploader)
+    if existing:
+        # keep the song's other playlists in its comment; cover, artist and title are already there
+        if playlist_names:
+            tag_song_with_playlists(dst, member_of + [pl for pl in playlist_names if pl not in member_of])
+            CATALOG.song_changed(dst)
+        QUEUE.set_state(job_id, DONE, path=dst)
+        print(f"✅ Already downloaded, reused: {os.path.basename(dst)}", flush=True)
+        return dst
 
-    await remove_from_txt(original_input)
-    print(f"✅ Finished download and processing: {os.path.basename(dst)}", flush=True)
+    # the thumbnail was fetched while the audio downloaded and converted
+    thumbnail_data = None
+    mime = None
+    if ctx["thumbnail"] is not None:
+        try:
+            thumbnail_data, mime = ctx["thumbnail"].result()
+        except Exception as e:
+            print(f"⚠️ Failed to download thumbnail: {e}", flush=True)
 
-# ------------------------
-# Remove song/query from songs.txt
-# ------------------------
-async def remove_from_txt(original_line):
-    if not os.path.exists(SONGS_FILE):
-        return
-    try:
-        async with aiofiles.open(SONGS_FILE, "r", encoding="utf-8") as f:
-            lines = await f.readlines()
-    except Exception:
-        lines = []
+    QUEUE.set_state(job_id, TAGGING, path=dst)
+    # Tag the song with playlist information (empty list for TempDownloads)
+    info = ctx["info"]
+    tag_song_with_playlists(dst, playlist_names, thumbnail_data, mime, info.get('uploader'),
+                            info.get('title'), info.get('webpage_url') or ctx["entry"]["url"])
+    CATALOG.song_changed(dst)  # its source-URL tag makes it show up in the downloaded-video archive
 
-    target = (original_line or "").strip()
-    async with aiofiles.open(SONGS_FILE, "w", encoding="utf-8") as f:
-        for line in lines:
-            if line.strip() and line.strip() != target:
-                await f.write(line)
+    QUEUE.set_state(job_id, DONE)
+    print(f"✅ Finished download and processing: {os.path.basename(dst)}", flush=True)
+    return dst
 
 # ------------------------
 # Playlist selection (multi-choice)
@@ -236,18 +281,36 @@ async def choose_playlists():
 # ------------------------
 # Search helper
 # ------------------------
+def resume_info(url):
+    """Info for the tags of a resumed job; without it only playlists and source URL are written."""
+    try:
+        return get_video_info(url)
+    except Exception as e:
+        print(f"⚠️ Could not fetch video info for {url}: {e}", flush=True)
+        return {}
+
+def get_video_info(url):
+    """Video info from yt-dlp without downloading (cached, and reused by the download)."""
+    info = META_CACHE.get(video_key(url), INFO_TTL)
+    if info is None:
+        with YDL_POOL.checkout(METADATA_OPTS) as ydl:
+            info = slim_info(ydl.extract_info(url, download=False))
+        META_CACHE.put(video_key(url), info)
+    return info
+
 def get_title_from_url(url):
     """Get title from URL using yt-dlp without downloading."""
-    opts = {"quiet": True, "skip_download": True}
-    with YoutubeDL(opts) as ydl:
-        info = ydl.extract_info(url, download=False)
-        return info.get("title", url)
+    return get_video_info(url).get("title", url)
 
 def search_youtube_sync(query, max_results=5):
-    opts = {"quiet": True, "skip_download": True, "extract_flat": "in_playlist"}
-    with YoutubeDL(opts) as ydl:
-        info = ydl.extract_info(f"ytsearch{max_results}:{query}", download=False)
-        return info.get("entries", [])
+    key = search_key(query, max_results)
+    entries = META_CACHE.get(key, SEARCH_TTL)
+    if entries is None:
+        with YDL_POOL.checkout(SEARCH_OPTS) as ydl:
+            info = ydl.extract_info(f"ytsearch{max_results}:{query}", download=False)
+        entries = [slim_info(e) for e in info.get("entries", [])]
+        META_CACHE.put(key, entries)
+    return entries
 
 async def search_youtube(query, max_results=5):
     loop = asyncio.get_running_loop()
@@ -256,37 +319,135 @@ async def search_youtube(query, max_results=5):
 # ------------------------
 # Orchestrator
 # ------------------------
-sem = asyncio.Semaphore(MAX_CONCURRENT)
+def on_concurrency_change(old, new, reason):
+    print(f"🎚️ Parallel downloads {old} → {new} ({reason})", flush=True)
+
+GOVERNOR = Governor(DOWNLOAD_WORKERS, adaptive=ADAPTIVE_DOWNLOADS, on_change=on_concurrency_change)
+PIPELINE = Pipeline([
+    Stage("download", fetch_stage, governor=GOVERNOR),
+    Stage("transcode", transcode_stage, TRANSCODE_WORKERS),
+    Stage("write", write_stage, download_pipeline.WRITER_WORKERS),
+])
+
 async def limit_downloads(entry, playlist_names):
+    """Queue a job (already in the downloading state) on the pipeline and wait until it leaves it."""
+    ctx = {"entry": entry, "playlists": playlist_names}
+    try:
+        if entry["state"] == TAGGING:
+            # interrupted after the move and playlist writes (QUEUE.recover): only the tags are left
+            info = await asyncio.to_thread(resume_info, entry["url"])
+            ctx.update(src=entry["path"], info=info,
+                       thumbnail=THUMBNAILS.prefetch(info["thumbnail"]) if info.get("thumbnail") else None)
+            fut = await asyncio.to_thread(PIPELINE.submit, ctx, "write")
+        else:
+            existing = await asyncio.to_thread(downloaded_song, entry["url"])
+            if existing:
+                # skip download and transcode: the writer only adds the library file to the playlists
+                print(f"♻️ Already in the library: {os.path.basename(existing)}", flush=True)
+                ctx.update(src=existing, existing=True)
+                fut = await asyncio.to_thread(PIPELINE.submit, ctx, "write")
+            else:
+                fut = PIPELINE.submit(ctx)
+        await asyncio.wrap_future(fut)
+    except Exception as e:
+        print(f"⚠️ Download failed for {entry['url']}: {e}", flush=True)
+        QUEUE.set_state(entry["id"], FAILED, error=str(e))
+
+async def queue_collection(job_id, url, listing=None):
+    """
+    Expand a YouTube playlist/channel link into one download job per video, all going to the same
+    playlists, and start them. job_id is the queue job of the link itself (None if typed in);
+    `listing` is an expansion already under way.
+    """
+    print(f"\n📃 Reading list: {url}", flush=True)
+    try:
+        title, videos = await (listing or asyncio.to_thread(expand_collection, url))
+    except Exception as e:
+        print(f"⚠️ Could not read {url}: {e}", flush=True)
+        if job_id is not None:
+            QUEUE.set_state(job_id, FAILED, error=str(e))
+        return []
+
+    print(f"📃 {title}: {len(videos)} video(s)", flush=True)
+    playlist_names = await choose_playlists() if videos else []
+    entries, skipped = await asyncio.to_thread(queue_videos, QUEUE, CATALOG, videos, playlist_names)
+    if skipped:
+        print(f"⏭️  Skipped {skipped} video(s) already in the library or the queue", flush=True)
+    print(f"📥 Queued {len(entries)} video(s) from {title}", flush=True)
+    if job_id is not None:
+        QUEUE.set_state(job_id, DONE)
+    return [asyncio.create_task(limit_downloads(entry, playlist_names)) for entry in entries]
+
+def start_job(job_id, url, playlist_names):
+    """The user picked what to download: record it so a crash from here on can be resumed."""
+    QUEUE.set_state(job_id, DOWNLOADING, url=url, playlists=playlist_names)
+    return QUEUE.get(job_id)
+
+async def resolve_job(job, sem):
+    """Look up what a queued line refers to: a list's videos, a link's title or a query's results."""
+    line = job["input"]
     async with sem:
-        await download_song(entry, playlist_names)
+        if "http" in line and is_collection_url(line):
+            return await asyncio.to_thread(expand_collection, line)
+        if "http" in line:
+            return await asyncio.to_thread(get_title_from_url, line)
+        return await search_youtube(line, max_results=5)
 
 async def process_links():
-    try:
-        async with aiofiles.open(SONGS_FILE, "r", encoding="utf-8") as f:
-            lines = await f.readlines()
-    except UnicodeDecodeError:
-        async with aiofiles.open(SONGS_FILE, "r", encoding="cp1252") as f:
-            lines = await f.readlines()
-    except FileNotFoundError:
-        print("No songs.txt found; nothing to do.", flush=True)
+    imported = await asyncio.to_thread(QUEUE.import_file, SONGS_FILE)
+    if imported:
+        print(f"📥 Queued {imported} new line(s) from songs.txt", flush=True)
+    given_up = QUEUE.given_up()
+    if given_up:
+        print(f"⚠️ {len(given_up)} song(s) failed {MAX_ATTEMPTS} times and are no longer retried "
+              f"(add the line to songs.txt again to retry):", flush=True)
+        for job in given_up:
+            print(f"   {job['input']}: {job['error']}", flush=True)
+
+    jobs = QUEUE.jobs(PENDING)
+    if not jobs:
+        print("No songs in songs.txt or the queue; nothing to do.", flush=True)
         return
 
-    links = [l.strip() for l in lines if "http" in l]
-    queries = [l.strip() for l in lines if "http" not in l and l.strip()]
+    links = [job for job in jobs if "http" in job["input"]]
+    queries = [job for job in jobs if "http" not in job["input"]]
+    jobs = links + queries
+
+    # Every title lookup / search starts now (RESOLVE_CONCURRENCY at a time, in prompt order),
+    # so the prompts below rarely wait on the network
+    sem = asyncio.Semaphore(RESOLVE_CONCURRENCY)
+    lookups = [asyncio.create_task(resolve_job(job, sem)) for job in jobs]
 
     tasks = []
-    for url in links:
-        title = await asyncio.to_thread(get_title_from_url, url)
-        print(f"\nProcessing: \x1b]8;;{url}\x1b\\{title}\x1b]8;;\x1b\\", flush=True)
-        playlist_names = await choose_playlists()
-        entry = {"url": url, "input": url}
-        tasks.append(asyncio.create_task(limit_downloads(entry, playlist_names)))
-
-    for query in queries:
-        results = await search_youtube(query, max_results=5)
+    for job, lookup in zip(jobs, lookups):
+        QUEUE.set_state(job["id"], RESOLVING)
+
+        if "http" in job["input"]:
+            url = job["input"]
+            if is_collection_url(url):
+                tasks.extend(await queue_collection(job["id"], url, lookup))
+                continue
+            try:
+                title = await lookup
+            except Exception as e:
+                print(f"⚠️ Could not get the title of {url}: {e}", flush=True)
+                title = url
+            print(f"\nProcessing: \x1b]8;;{url}\x1b\\{title}\x1b]8;;\x1b\\", flush=True)
+            playlist_names = await choose_playlists()
+            entry = start_job(job["id"], url, playlist_names)
+            # starts downloading right away, while the next lines are still being answered
+            tasks.append(asyncio.create_task(limit_downloads(entry, playlist_names)))
+            continue
+
+        query = job["input"]
+        try:
+            results = await lookup
+        except Exception as e:
+            print(f"\n⚠️ Search failed for {query}: {e}", flush=True)
+            results = None
         if not results:
             print(f"\nNo results for: {query}", flush=True)
+            QUEUE.release(job["id"])
             continue
 
         print(f"\nResults for: {query}", flush=True)
@@ -300,8 +461,10 @@ async def process_links():
         if choice.isdigit() and 1 <= int(choice) <= len(results):
             sel = results[int(choice) - 1]
             playlist_names = await choose_playlists()
-            entry = {"url": f"https://www.youtube.com/watch?v={sel.get('id')}", "input": query}
+            entry = start_job(job["id"], f"https://www.youtube.com/watch?v={sel.get('id')}", playlist_names)
             tasks.append(asyncio.create_task(limit_downloads(entry, playlist_names)))
+        else:
+            QUEUE.release(job["id"])
 
     if tasks:
         await asyncio.gather(*tasks)
@@ -314,15 +477,32 @@ async def main():
     os.makedirs(PLAYLISTS_DIR, exist_ok=True)
     os.makedirs(ALL_SONGS, exist_ok=True)
 
+    # Resume downloads a previous run was in the middle of
+    resumed = QUEUE.recover()
+    for job in resumed:
+        print(f"🔁 Resuming interrupted download: {job['input']}", flush=True)
+    resume_tasks = [asyncio.create_task(limit_downloads(job, job["playlists"])) for job in resumed]
+
+    await run_menu()
+
+    if resume_tasks:
+        await asyncio.gather(*resume_tasks)
+
+async def run_menu():
     choice = await async_input("Do you want to (1) input a single song/query or (2) use songs.txt? ")
     if choice.strip() == "1":
         user_input = await async_input("Enter URL or search query: ")
-        if "http" in user_input:
+        if "http" in user_input and is_collection_url(user_input):
+            # Playlist / channel: every video, into the same playlists
+            tasks = await queue_collection(None, user_input.strip())
+            if tasks:
+                await asyncio.gather(*tasks)
+        elif "http" in user_input:
             # Treat as direct link
             title = await asyncio.to_thread(get_title_from_url, user_input)
             print(f"Processing: \x1b]8;;{user_input}\x1b\\{title}\x1b]8;;\x1b\\", flush=True)
             playlist_names = await choose_playlists()
-            entry = {"url": user_input, "input": user_input}
+            entry = QUEUE.add(user_input, url=user_input, playlists=playlist_names, state=DOWNLOADING)
             await limit_downloads(entry, playlist_names)
         else:
             # Treat as search query
@@ -342,7 +522,8 @@ async def main():
             if choice.isdigit() and 1 <= int(choice) <= len(results):
                 sel = results[int(choice) - 1]
                 playlist_names = await choose_playlists()
-                entry = {"url": f"https://www.youtube.com/watch?v={sel.get('id')}", "input": user_input}
+                url = f"https://www.youtube.com/watch?v={sel.get('id')}"
+                entry = QUEUE.add(user_input, url=url, playlists=playlist_names, state=DOWNLOADING)
                 await limit_downloads(entry, playlist_names)
     else:
         await process_links()
@@ -2,15 +2,28 @@ import tkinter as tk
 from tkinter import ttk, messagebox, filedialog, simpledialog
 import asyncio
 import threading
+import queue
 import os
 import shutil
+import time
 from pathlib import Path
-import difflib
 import random
-from yt_dlp import YoutubeDL
-from mutagen.id3 import ID3, COMM, APIC, TPE1, ID3NoHeaderError
-import aiofiles
-import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from playlist_index import PlaylistIndex, PlaylistTransaction, to_rel
+from library_catalog import LibraryCatalog, default_data_dir, video_id_from_url
+from song_search import SongSearchIndex, normalize
+from ytdl_pool import YDL_POOL, SEARCH_OPTS, METADATA_OPTS, download_opts
+from thumbnails import ThumbnailFetcher
+import job_progress
+from job_progress import ProgressTracker, describe, format_bytes
+from youtube_lists import is_collection_url, expand_collection, queue_videos
+from metadata_cache import MetadataCache, search_key, video_key, slim_info, SEARCH_TTL, INFO_TTL
+import download_pipeline
+from download_pipeline import (Governor, Pipeline, Stage, CancelToken, extract_audio, downloaded_path,
+                               remove_partial_files, PRIORITY_HIGH, PRIORITY_NORMAL)
+from yt_dlp.utils import DownloadCancelled
+from tagging import write_song_tags, is_taggable
+from download_queue import DownloadQueue, MAX_ATTEMPTS, PENDING, RESOLVING, DOWNLOADING, CONVERTING, TAGGING, DONE, FAILED, CANCELLED
 
 # Load .env
 def load_env():
@@ -32,6 +45,22 @@ PLAYLISTS_DIR = os.environ['PLAYLISTS_DIR']
 ALL_SONGS = os.environ['ALL_SONGS']
 MAX_CONCURRENT = 10
 
+# Pipeline stage sizes: parallel downloads, parallel ffmpeg conversions (tagging is always one at a time)
+DOWNLOAD_WORKERS = int(os.environ.get('DOWNLOAD_WORKERS', MAX_CONCURRENT))
+TRANSCODE_WORKERS = int(os.environ.get('TRANSCODE_WORKERS', download_pipeline.TRANSCODE_WORKERS))
+# Let the download limit follow throughput / rate limiting / transcode backlog
+ADAPTIVE_DOWNLOADS = os.environ.get('ADAPTIVE_DOWNLOADS', '').lower() in ('1', 'true', 'yes')
+# Keep YouTube's own audio stream (opus remuxed into .opus, m4a as is) instead of re-encoding to mp3
+PASSTHROUGH_AUDIO = os.environ.get('PASSTHROUGH_AUDIO', '').lower() in ('1', 'true', 'yes')
+AUDIO_CODEC = download_pipeline.PASSTHROUGH_CODEC if PASSTHROUGH_AUDIO else "mp3"
+# Batch mode: how many upcoming lines are searched ahead, and how many searches run at once
+PREFETCH_AHEAD = int(os.environ.get('PREFETCH_AHEAD', 3))
+PREFETCH_WORKERS = int(os.environ.get('PREFETCH_WORKERS', 2))
+PROGRESS_REFRESH_MS = 250   # the Downloads list / progress bar redraw at most this often
+LOOP_IO_WORKERS = 8         # blocking calls (searches, title lookups, file work) run at once on the GUI's loop
+LOG_FRAME_MS = 50           # queued status messages are written to the log this often, in one insert
+MAX_LOG_LINES = 1000        # the status log keeps only the newest lines
+
 DEST_ROOT = Path(os.environ['PLAYLISTS_DIR'])
 ALL_SONGS_PATH = DEST_ROOT / "AllSongs"
 TEMP_DOWNLOADS = DEST_ROOT.parent / "TempDownloads"
@@ -39,6 +68,15 @@ PLAYLISTS = DEST_ROOT
 
 AUDIO_EXTS = {".mp3", ".flac", ".m4a", ".aac", ".wav", ".ogg", ".opus", ".wma", ".aiff", ".alac"}
 
+PLAYLIST_INDEX = PlaylistIndex(PLAYLISTS)
+CATALOG = LibraryCatalog(default_data_dir(PLAYLISTS) / "library.db", PLAYLISTS, [ALL_SONGS_PATH, TEMP_DOWNLOADS], watch=True)
+SEARCH_INDEX = SongSearchIndex()
+QUEUE = DownloadQueue(default_data_dir(PLAYLISTS) / "downloads.db")
+META_CACHE = MetadataCache(default_data_dir(PLAYLISTS) / "metadata.db")
+THUMBNAILS = ThumbnailFetcher(default_data_dir(PLAYLISTS) / "thumbnails")
+PROGRESS = ProgressTracker()
+CANCEL_TOKENS = {}   # job id -> CancelToken, while the job is on the pipeline
+
 class MusicGUI:
     def __init__(self, root):
         self.root = root
@@ -87,11 +125,25 @@ class MusicGUI:
 
         self.root.configure(bg=self.bg_color)
 
+        GOVERNOR.on_change = self._on_concurrency_change
+
+        # log_status only queues the message; the Tk thread writes them out in batches
+        self._log_queue = queue.SimpleQueue()
+        self._log_lines = 0
+
+        # Downloads, YouTube searches and file work all run on one background event loop
+        self.loop = BackgroundLoop(self.root)
+        # One background worker answers the library search boxes as you type
+        self.live_search = LiveSearch(self.root, self.log_status)
+        # Batch mode searches the next few lines while the current one is on screen
+        self.batch_prefetcher = BatchPrefetcher()
+
         # Batch state
         self.batch_mode = False
         self.batch_lines = []
         self.batch_index = 0
         self.random_mode = tk.BooleanVar()
+        self.random_mode.trace_add("write", self._on_random_toggled)
 
         # Playlist vars for different tabs
         self.song_changer_playlist_vars = {}
@@ -129,6 +181,7 @@ class MusicGUI:
         # Status text
         self.status_text = tk.Text(self.status_frame, height=5, state=tk.DISABLED, bg=self.main_frame_bg, fg=self.fg_color)
         self.status_text.pack(fill=tk.X, padx=5, pady=5)
+        self.root.after(LOG_FRAME_MS, self._drain_log)
 
         # Custom progress bar with text inside
         progress_frame = tk.Frame(self.status_frame, bg=self.main_frame_bg)
@@ -157,6 +210,11 @@ class MusicGUI:
         self.notebook.add(self.download_batch_frame, text="Batch Download")
         self.setup_download_batch_tab()
 
+        # Downloads tab: every job in flight with its real progress
+        self.downloads_frame = tk.Frame(self.notebook, bg=self.main_frame_bg)
+        self.notebook.add(self.downloads_frame, text="Downloads")
+        self.setup_downloads_tab()
+
         # Playlist Changer tab
         self.song_changer_frame = tk.Frame(self.notebook, bg=self.main_frame_bg)
         self.notebook.add(self.song_changer_frame, text="Playlist Changer")
@@ -186,6 +244,15 @@ class MusicGUI:
         os.makedirs(PLAYLISTS_DIR, exist_ok=True)
         os.makedirs(ALL_SONGS, exist_ok=True)
 
+        # Only folders/playlists that changed since the last run are re-read
+        CATALOG.refresh()
+        PLAYLIST_INDEX.seed(CATALOG.playlist_snapshot())
+
+        # Resume downloads a previous run was in the middle of
+        for job in QUEUE.recover():
+            self.log_status(f"Resuming interrupted download: {job['input']}")
+            self._run_download(job, job["playlists"])
+
         self.update_playlist_checkbuttons()
         self.update_playlist_list()
         self.update_single_playlist_checkbuttons()
@@ -288,9 +355,11 @@ class MusicGUI:
         # Use grid for layout
         search_frame.columnconfigure(0, weight=1)
 
-        self.search_entry = ttk.Entry(search_frame)
+        self.search_var = tk.StringVar()
+        self.search_entry = ttk.Entry(search_frame, textvariable=self.search_var)
         self.search_entry.grid(row=0, column=0, sticky=tk.EW, padx=(5,0), pady=5)
         self.search_entry.bind("<Return>", lambda e: self.song_changer_search())
+        self.search_var.trace_add("write", self._on_song_changer_typed)
 
         tk.Button(search_frame, text="Search", command=self.song_changer_search, bg=self.button_bg, fg=self.fg_color).grid(row=0, column=1, padx=(5,5), pady=5)
 
@@ -351,9 +420,11 @@ class MusicGUI:
         search_frame = tk.LabelFrame(self.bulk_frame, text="Search Songs", bg=self.label_frame_bg, fg=self.fg_color)
         search_frame.pack(fill=tk.X, padx=10, pady=5)
 
-        self.bulk_search_entry = ttk.Entry(search_frame)
+        self.bulk_search_var = tk.StringVar()
+        self.bulk_search_entry = ttk.Entry(search_frame, textvariable=self.bulk_search_var)
         self.bulk_search_entry.pack(fill=tk.X, padx=5, pady=5)
         self.bulk_search_entry.bind("<Return>", lambda e: self.bulk_search())
+        self.bulk_search_var.trace_add("write", self._on_bulk_typed)
 
         tk.Button(search_frame, text="Search", command=self.bulk_search, bg=self.button_bg, fg=self.fg_color).pack(pady=5)
 
@@ -377,15 +448,96 @@ class MusicGUI:
 
     def setup_auto_clean_tab(self):
         ttk.Label(self.auto_clean_frame, text="This will move all songs from AllSongs that have no playlists to TempDownloads.").pack(pady=10)
+        tk.Button(self.auto_clean_frame, text="Preview", command=self.preview_auto_clean, bg=self.button_bg, fg=self.fg_color).pack(pady=10)
         tk.Button(self.auto_clean_frame, text="Clean Orphaned Songs", command=self.run_auto_clean, bg=self.button_bg, fg=self.fg_color).pack(pady=10)
 
+    def setup_downloads_tab(self):
+        self.downloads_summary = ttk.Label(self.downloads_frame, text="No downloads running")
+        self.downloads_summary.pack(fill=tk.X, padx=10, pady=5)
+        self.downloads_listbox = tk.Listbox(self.downloads_frame, bg=self.main_frame_bg, fg=self.fg_color, selectbackground=self.accent_color)
+        self.downloads_listbox.pack(fill=tk.BOTH, expand=True, padx=10, pady=(0, 5))
+
+        button_frame = tk.Frame(self.downloads_frame, bg=self.main_frame_bg)
+        button_frame.pack(fill=tk.X, padx=10, pady=(0, 10))
+        self.pause_button = tk.Button(button_frame, text="Pause Queue", command=self.toggle_pause_downloads, bg=self.button_bg, fg=self.fg_color)
+        self.pause_button.pack(side=tk.LEFT, padx=5)
+        tk.Button(button_frame, text="Cancel Selected", command=self.cancel_selected_download, bg=self.button_bg, fg=self.fg_color).pack(side=tk.LEFT, padx=5)
+        self._download_lines = []
+        self._download_ids = []
+        self._progress_version = None
+        self.root.after(PROGRESS_REFRESH_MS, self._poll_progress)
+
+    def _poll_progress(self):
+        """Redraw the Downloads list and the progress bar from PROGRESS, only when something changed."""
+        version, jobs, totals = PROGRESS.snapshot()
+        if version != self._progress_version:
+            self._progress_version = version
+            self._render_downloads(jobs, totals)
+        self.root.after(PROGRESS_REFRESH_MS, self._poll_progress)
+
+    def _render_downloads(self, jobs, totals):
+        lines = [describe(job) for job in jobs]
+        # only rows whose text changed are replaced
+        for i, line in enumerate(lines):
+            if i < len(self._download_lines):
+                if self._download_lines[i] == line:
+                    continue
+                self.downloads_listbox.delete(i)
+            self.downloads_listbox.insert(i, line)
+        if len(self._download_lines) > len(lines):
+            self.downloads_listbox.delete(len(lines), tk.END)
+        self._download_lines = lines
+        self._download_ids = [job["id"] for job in jobs]
+
+        if totals["active"]:
+            summary = (f"{totals['active']} job(s), {totals['downloading']} downloading — "
+                       f"{format_bytes(totals['speed'])}/s")
+            if PIPELINE.paused:
+                summary += " (paused: no new downloads start)"
+            active = [job for job in jobs if job["finished"] is None]
+            self._update_progress(sum(job_progress.percent(job) for job in active) // len(active), summary)
+        else:
+            summary = "No downloads running"
+            if jobs:
+                self._update_progress(100, "Complete")
+            else:
+                self._update_progress(0, "Ready")
+        self.downloads_summary.config(text=summary)
+
+    def toggle_pause_downloads(self):
+        """Pause / resume the whole queue: running downloads finish, queued ones wait."""
+        if PIPELINE.paused:
+            PIPELINE.resume()
+            self.pause_button.config(text="Pause Queue")
+            self.log_status("Download queue resumed")
+        else:
+            PIPELINE.pause()
+            self.pause_button.config(text="Resume Queue")
+            self.log_status("Download queue paused; running downloads will finish")
+        self._progress_version = None   # redraw the summary
+
+    def cancel_selected_download(self):
+        selected = self.downloads_listbox.curselection()
+        if not selected:
+            messagebox.showerror("Error", "Select a download to cancel")
+            return
+        job_id = self._download_ids[selected[0]]
+        if not cancel_download(job_id):
+            self.log_status("That download already finished")
+            return
+        self.log_status(f"Cancelling: {self._download_lines[selected[0]].split(' — ')[0]}")
+
     def setup_settings_tab(self):
         self.settings_frame.columnconfigure(1, weight=1)
 
         ttk.Label(self.settings_frame, text="Max Concurrent Downloads:").grid(row=0, column=0, sticky=tk.W, padx=5, pady=5)
-        self.max_concurrent_var = tk.StringVar(value=str(MAX_CONCURRENT))
-        spin = tk.Spinbox(self.settings_frame, from_=1, to=50, textvariable=self.max_concurrent_var, bg=self.secondary_bg, fg=self.fg_color)
-        spin.grid(row=0, column=1, sticky=tk.W, padx=5, pady=5)
+        self.max_concurrent_var = tk.StringVar(value=str(GOVERNOR.limit))
+        self.adaptive_var = tk.BooleanVar(value=GOVERNOR.adaptive)
+        limit_frame = tk.Frame(self.settings_frame, bg=self.main_frame_bg)
+        limit_frame.grid(row=0, column=1, sticky=tk.W, padx=5, pady=5)
+        spin = tk.Spinbox(limit_frame, from_=1, to=GOVERNOR.ceiling, textvariable=self.max_concurrent_var, bg=self.secondary_bg, fg=self.fg_color)
+        spin.pack(side=tk.LEFT)
+        ttk.Checkbutton(limit_frame, text="Adaptive", variable=self.adaptive_var).pack(side=tk.LEFT, padx=5)
         tk.Button(self.settings_frame, text="Save", command=self.save_max_concurrent, bg=self.button_bg, fg=self.fg_color).grid(row=0, column=2, padx=5, pady=5)
 
         ttk.Label(self.settings_frame, text="Songs File:").grid(row=1, column=0, sticky=tk.W, padx=5, pady=5)
@@ -404,21 +556,40 @@ class MusicGUI:
         tk.Button(self.settings_frame, text="Save Settings", command=self.save_settings, bg=self.button_bg, fg=self.fg_color).grid(row=5, column=0, columnspan=3, pady=5)
 
     def update_playlist_list(self):
-        playlists = [fn[:-4] for fn in sorted(os.listdir(PLAYLISTS_DIR)) if fn.endswith(".m3u")]
+        playlists = playlist_names()
         self.update_cleanse_menu()
         self.update_bulk_menu()
 
     def update_playlist_listbox(self):
-        playlists = [fn[:-4] for fn in sorted(os.listdir(PLAYLISTS_DIR)) if fn.endswith(".m3u")]
+        playlists = playlist_names()
         self.playlist_listbox.delete(0, tk.END)
         for pl in playlists:
             self.playlist_listbox.insert(tk.END, pl)
 
     def log_status(self, message):
-        self.status_text.config(state=tk.NORMAL)
-        self.status_text.insert(tk.END, message + "\n")
-        self.status_text.see(tk.END)
-        self.status_text.config(state=tk.DISABLED)
+        """Safe from any thread: the message shows up in the log on the next frame."""
+        self._log_queue.put(message)
+
+    def _drain_log(self):
+        """Write everything queued since the last frame in one insert, dropping the oldest lines past MAX_LOG_LINES."""
+        messages = []
+        try:
+            while True:
+                messages.append(self._log_queue.get_nowait())
+        except queue.Empty:
+            pass
+        if messages:
+            lines = "\n".join(messages).split("\n")[-MAX_LOG_LINES:]
+            self.status_text.config(state=tk.NORMAL)
+            self.status_text.insert(tk.END, "\n".join(lines) + "\n")
+            self._log_lines += len(lines)
+            excess = self._log_lines - MAX_LOG_LINES
+            if excess > 0:
+                self.status_text.delete("1.0", f"{excess + 1}.0")
+                self._log_lines = MAX_LOG_LINES
+            self.status_text.see(tk.END)
+            self.status_text.config(state=tk.DISABLED)
+        self.root.after(LOG_FRAME_MS, self._drain_log)
 
     def process_download(self):
         mode = self.download_mode.get()
@@ -437,16 +608,46 @@ class MusicGUI:
         if not query:
             messagebox.showerror("Error", "Enter a URL or search query")
             return
-        # Run search in thread
-        threading.Thread(target=self._search_single_youtube, args=(query,)).start()
+        if is_collection_url(query):
+            # Playlist / channel link: every video, into the ticked playlists
+            self.log_status(f"Reading list: {query}")
+            self.loop.run_blocking(
+                expand_collection, query,
+                on_done=lambda listing: self._confirm_collection(*listing),
+                on_error=lambda e: messagebox.showerror("Error", f"Could not read the list: {e}"),
+            )
+            return
+        self._search_single_youtube(query)
+
+    def _confirm_collection(self, title, videos):
+        if not videos:
+            self.log_status(f"No videos in: {title}")
+            return
+        playlists = [pl for pl in self.single_playlist_vars if self.single_playlist_vars[pl].get()]
+        target = ", ".join(playlists) or "TempDownloads"
+        if not messagebox.askyesno("Download list", f"Download {len(videos)} video(s) of \"{title}\" into {target}?"):
+            return
+        self._queue_collection(title, videos, playlists)
+
+    def _queue_collection(self, title, videos, playlists):
+        """One download job per video of an expanded playlist/channel, all into `playlists`."""
+        self.loop.submit(self._queue_collection_async(title, videos, playlists),
+                         on_error=lambda e: self.log_status(f"Queueing {title} failed: {e}"))
+
+    async def _queue_collection_async(self, title, videos, playlists):
+        entries, skipped = await asyncio.to_thread(queue_videos, QUEUE, CATALOG, videos, playlists)
+        if skipped:
+            self.log_status(f"Skipped {skipped} video(s) already in the library or the queue")
+        self.log_status(f"Queued {len(entries)} video(s) from {title}")
+        await download_songs_gui(entries, playlists, self.log_status)
 
     def _search_single_youtube(self, query):
         self.log_status(f"Searching for: {query}")
-        try:
-            results = search_youtube_sync(query, max_results=5)
-            self.root.after(0, self.display_single_search_results, results, query)
-        except Exception as e:
-            self.root.after(0, lambda: messagebox.showerror("Error", f"Search failed: {e}"))
+        self.loop.submit(
+            search_youtube(query, max_results=5),
+            on_done=lambda results: self.display_single_search_results(results, query),
+            on_error=lambda e: messagebox.showerror("Error", f"Search failed: {e}"),
+        )
 
     def display_single_search_results(self, results, original_query):
         self.single_results_listbox.delete(0, tk.END)
@@ -465,8 +666,10 @@ class MusicGUI:
         index = selected[0]
         sel = self.single_search_results[index]
         playlists = [pl for pl in self.single_playlist_vars if self.single_playlist_vars[pl].get()]
-        entry = {"url": f"https://www.youtube.com/watch?v={sel.get('id')}", "input": self.single_original_query}
-        threading.Thread(target=self._download_song, args=(entry, playlists)).start()
+        entry = QUEUE.add(self.single_original_query, url=f"https://www.youtube.com/watch?v={sel.get('id')}",
+                          playlists=playlists, state=DOWNLOADING)
+        # jumps ahead of batch items waiting for a download slot
+        self._run_download(entry, playlists, PRIORITY_HIGH)
 
     def open_single_video_link(self, event):
         selected = self.single_results_listbox.curselection()
@@ -489,11 +692,11 @@ class MusicGUI:
 
     def _search_youtube(self, query):
         self.log_status(f"Searching for: {query}")
-        try:
-            results = search_youtube_sync(query, max_results=5)
-            self.root.after(0, self.display_search_results, results, query)
-        except Exception as e:
-            self.root.after(0, lambda: messagebox.showerror("Error", f"Search failed: {e}"))
+        self.loop.submit(
+            search_youtube(query, max_results=5),
+            on_done=lambda results: self.display_search_results(results, query),
+            on_error=lambda e: messagebox.showerror("Error", f"Search failed: {e}"),
+        )
 
     def display_search_results(self, results, original_query):
         self.results_listbox.delete(0, tk.END)
@@ -512,30 +715,36 @@ class MusicGUI:
         index = selected[0]
         sel = self.search_results[index]
         playlists = [pl for pl in self.download_playlist_vars if self.download_playlist_vars[pl].get()]
-        entry = {"url": f"https://www.youtube.com/watch?v={sel.get('id')}", "input": self.original_query}
-        threading.Thread(target=self._download_song, args=(entry, playlists)).start()
+        entry = QUEUE.add(self.original_query, url=f"https://www.youtube.com/watch?v={sel.get('id')}",
+                          playlists=playlists, state=DOWNLOADING)
+        self._download_song(entry, playlists)
+
+    def _run_download(self, entry, playlists, priority=PRIORITY_NORMAL):
+        self.loop.submit(download_song_gui(entry, playlists, self.log_status, priority))
 
     def _download_song(self, entry, playlists):
-        # Start download in a separate thread so this function returns immediately
-        threading.Thread(target=lambda: asyncio.run(download_song_gui(entry, playlists, self.log_status, self._update_progress))).start()
+        # The download runs on the background loop, so this returns immediately.
+        # A song picked outside a batch goes ahead of the batch items still waiting for a slot.
+        self._run_download(entry, playlists, PRIORITY_NORMAL if self.batch_mode else PRIORITY_HIGH)
         # Immediately move to next item in batch mode
         if self.batch_mode:
-            self.root.after(0, self.process_next_batch_item)
+            self.process_next_batch_item()
 
     def process_batch_download(self):
-        try:
-            with open(SONGS_FILE, "r", encoding="utf-8") as f:
-                self.batch_lines = [line.strip() for line in f if line.strip()]
-        except UnicodeDecodeError:
-            with open(SONGS_FILE, "r", encoding="cp1252") as f:
-                self.batch_lines = [line.strip() for line in f if line.strip()]
-        except FileNotFoundError:
-            self.log_status("No songs.txt found; nothing to do.")
+        # songs.txt is only an import source; the batch walks the pending jobs of the queue
+        imported = QUEUE.import_file(SONGS_FILE)
+        if imported:
+            self.log_status(f"Queued {imported} new line(s) from songs.txt")
+        report_given_up(self.log_status)
+        self.batch_lines = QUEUE.jobs(PENDING)
+        if not self.batch_lines:
+            self.log_status("No songs in songs.txt or the queue; nothing to do.")
             return
 
         if self.random_mode.get():
             random.shuffle(self.batch_lines)
 
+        self.batch_prefetcher.reset()
         self.batch_index = 0
         self.batch_mode = True
         self.skip_button.pack(side=tk.LEFT, padx=5)
@@ -543,7 +752,12 @@ class MusicGUI:
         self.process_next_batch_item()
 
     def process_next_batch_item(self):
+        # a job that was skipped (or failed to resolve) goes back to pending for the next batch
+        if self.batch_index > 0:
+            QUEUE.release(self.batch_lines[self.batch_index - 1]["id"])
+
         if self.batch_index >= len(self.batch_lines):
+            self.batch_prefetcher.reset()
             self.batch_lines = []
             self.batch_index = 0
             self.batch_mode = False
@@ -552,18 +766,59 @@ class MusicGUI:
             self.log_status("Batch processing completed.")
             return
 
-        line = self.batch_lines[self.batch_index]
+        job = self.batch_lines[self.batch_index]
         self.batch_index += 1
-        self.batch_current_song_label.config(text=line)
-
-        if "http" in line:
-            threading.Thread(target=self._process_batch_url, args=(line,)).start()
+        QUEUE.set_state(job["id"], RESOLVING)
+        self.batch_current_song_label.config(text=job["input"])
+        self._request_batch_item(job)
+
+    def _request_batch_item(self, job):
+        """Show the results for the current job: right away if prefetched, else once they arrive."""
+        fut = self.batch_prefetcher.get(self.batch_lines, self.batch_index - 1)
+        generation = self.batch_prefetcher.generation
+        if fut.done():
+            self._show_batch_item(job, generation, fut)
         else:
-            threading.Thread(target=self._process_batch_query, args=(line,)).start()
+            self.batch_results_listbox.delete(0, tk.END)
+            fut.add_done_callback(lambda f: self.root.after(0, self._show_batch_item, job, generation, f))
+
+    def _show_batch_item(self, job, generation, fut):
+        # dropped (reshuffle / new batch) or the user already moved on
+        if fut.cancelled() or generation != self.batch_prefetcher.generation or not self.batch_mode:
+            return
+        if self.batch_lines[self.batch_index - 1] is not job:
+            return
+        line = job["input"]
+        try:
+            title, results = fut.result()
+        except Exception as e:
+            kind = "URL" if "http" in line else "query"
+            self.log_status(f"Error processing {kind} {line}: {e}")
+            self.process_next_batch_item()
+            return
+        if not results:
+            self.log_status(f"No results for: {line}")
+            self.process_next_batch_item()
+            return
+        if is_collection_url(line):
+            self.log_status(f"{title}: {len(results)} video(s). Download queues all of them into the ticked playlists")
+        self.display_batch_search_results(results, line, title)
 
-    def display_batch_search_results(self, results, original_query):
+    def _on_random_toggled(self, *args):
+        """Turning Random Order on mid-batch reshuffles the lines still to come."""
+        if not self.batch_mode or not self.random_mode.get():
+            return
+        rest = self.batch_lines[self.batch_index:]
+        random.shuffle(rest)
+        self.batch_lines[self.batch_index:] = rest
+        self.batch_prefetcher.reset()
+        if self.batch_index > 0:
+            self._request_batch_item(self.batch_lines[self.batch_index - 1])
+
+    def display_batch_search_results(self, results, original_query, title=None):
         self.batch_results_listbox.delete(0, tk.END)
         self.batch_search_results = results
+        self.batch_search_title = title or original_query   # a playlist/channel line: the list's title
         self.batch_original_query = original_query
         for i, r in enumerate(results, 1):
             title = r.get("title", "Unknown")
@@ -578,8 +833,16 @@ class MusicGUI:
         index = selected[0]
         sel = self.batch_search_results[index]
         playlists = [pl for pl in self.batch_playlist_vars if self.batch_playlist_vars[pl].get()]
-        entry = {"url": f"https://www.youtube.com/watch?v={sel.get('id')}", "input": self.batch_original_query}
-        threading.Thread(target=self._download_song, args=(entry, playlists)).start()
+        job = self.batch_lines[self.batch_index - 1]
+        if is_collection_url(job["input"]):
+            # the results are the list's videos: queue all of them, whichever one is selected
+            QUEUE.set_state(job["id"], DONE)
+            self._queue_collection(self.batch_search_title, list(self.batch_search_results), playlists)
+            self.process_next_batch_item()
+            return
+        QUEUE.set_state(job["id"], DOWNLOADING, url=f"https://www.youtube.com/watch?v={sel.get('id')}", playlists=playlists)
+        entry = QUEUE.get(job["id"])
+        self._download_song(entry, playlists)
 
     def open_batch_video_link(self, event):
         selected = self.batch_results_listbox.curselection()
@@ -593,28 +856,6 @@ class MusicGUI:
     def skip_current_batch(self):
         self.process_next_batch_item()
 
-    def _process_batch_url(self, line):
-        try:
-            title = get_title_from_url(line)
-            self.root.after(0, lambda: self.display_batch_search_results([{"title": title, "uploader": "N/A", "id": line.split("v=")[-1] if "v=" in line else line}], line))
-        except Exception as e:
-            self.log_status(f"Error processing URL {line}: {e}")
-            self.root.after(0, self.process_next_batch_item)
-
-    def _process_batch_query(self, line):
-        try:
-            results = search_youtube_sync(line, max_results=5)
-            if not results:
-                self.log_status(f"No results for: {line}")
-                self.root.after(0, self.process_next_batch_item)
-                return
-            self.root.after(0, lambda: self.display_batch_search_results(results, line))
-        except Exception as e:
-            self.log_status(f"Error processing query {line}: {e}")
-            self.root.after(0, self.process_next_batch_item)
-
-
-
     def create_new_playlist(self):
         name = simpledialog.askstring("New Playlist", "Enter playlist name:")
         if name:
@@ -622,6 +863,7 @@ class MusicGUI:
             if not os.path.exists(pl_path):
                 with open(pl_path, "w", encoding="utf-8") as f:
                     f.write("#EXTM3U\n")
+                PLAYLIST_INDEX.record(pl_path, [])
                 self.log_status(f"Created playlist: {name}")
                 self.update_playlist_list()
                 self.update_playlist_checkbuttons()
@@ -637,7 +879,7 @@ class MusicGUI:
         self.song_changer_playlist_checkbuttons = []
         self.song_changer_playlist_vars = {}
 
-        playlists = [fn[:-4] for fn in sorted(os.listdir(PLAYLISTS_DIR)) if fn.endswith(".m3u")]
+        playlists = playlist_names()
         cols = self._get_playlist_cols()
         for i, pl in enumerate(playlists):
             var = tk.BooleanVar()
@@ -655,7 +897,7 @@ class MusicGUI:
         self.download_playlist_checkbuttons = []
         self.download_playlist_vars = {}
 
-        playlists = [fn[:-4] for fn in sorted(os.listdir(PLAYLISTS_DIR)) if fn.endswith(".m3u")]
+        playlists = playlist_names()
         cols = self._get_playlist_cols()
         for i, pl in enumerate(playlists):
             var = tk.BooleanVar()
@@ -673,7 +915,7 @@ class MusicGUI:
         self.single_playlist_checkbuttons = []
         self.single_playlist_vars = {}
 
-        playlists = [fn[:-4] for fn in sorted(os.listdir(PLAYLISTS_DIR)) if fn.endswith(".m3u")]
+        playlists = playlist_names()
         cols = self._get_playlist_cols()
         for i, pl in enumerate(playlists):
             var = tk.BooleanVar()
@@ -691,7 +933,7 @@ class MusicGUI:
         self.batch_playlist_checkbuttons = []
         self.batch_playlist_vars = {}
 
-        playlists = [fn[:-4] for fn in sorted(os.listdir(PLAYLISTS_DIR)) if fn.endswith(".m3u")]
+        playlists = playlist_names()
         cols = self._get_playlist_cols()
         for i, pl in enumerate(playlists):
             var = tk.BooleanVar()
@@ -705,7 +947,7 @@ class MusicGUI:
     def update_cleanse_menu(self):
         if self.cleanse_playlist_menu:
             self.cleanse_playlist_menu.destroy()
-        playlists = [fn[:-4] for fn in sorted(os.listdir(PLAYLISTS_DIR)) if fn.endswith(".m3u")]
+        playlists = playlist_names()
         if playlists:
             self.cleanse_playlist_menu = tk.OptionMenu(self.cleanse_frame.winfo_children()[0], self.cleanse_playlist_var, *playlists)
             self.cleanse_playlist_menu.config(bg=self.main_frame_bg, fg=self.fg_color, activebackground=self.accent_color)
@@ -718,7 +960,7 @@ class MusicGUI:
     def update_bulk_menu(self):
         if self.bulk_playlist_menu:
             self.bulk_playlist_menu.destroy()
-        playlists = [fn[:-4] for fn in sorted(os.listdir(PLAYLISTS_DIR)) if fn.endswith(".m3u")]
+        playlists = playlist_names()
         if playlists:
             self.bulk_playlist_menu = tk.OptionMenu(self.bulk_frame.winfo_children()[0], self.bulk_playlist_var, *playlists)
             self.bulk_playlist_menu.config(bg=self.main_frame_bg, fg=self.fg_color, activebackground=self.accent_color)
@@ -736,11 +978,13 @@ class MusicGUI:
             import webbrowser
             webbrowser.open(term)
             return
-        threading.Thread(target=self._find_matches, args=(term,)).start()
+        self.live_search.submit("song_changer", term, self.display_song_matches)
 
-    def _find_matches(self, term):
-        matches = find_song_matches(term)
-        self.root.after(0, self.display_song_matches, matches)
+    def _on_song_changer_typed(self, *args):
+        term = self.search_entry.get().strip()
+        if term.startswith("http"):
+            return  # URLs are only opened on Enter/Search
+        self.live_search.schedule("song_changer", term, self.display_song_matches)
 
     def display_song_matches(self, matches):
         self.song_matches_listbox.delete(0, tk.END)
@@ -762,26 +1006,25 @@ class MusicGUI:
         self.last_selected_name = self.song_matches_data[selected[0]].name
         chosen_songs = [self.song_matches_data[i] for i in selected]
         keep_names = [pl for pl in self.song_changer_playlist_vars if self.song_changer_playlist_vars[pl].get()]
-        threading.Thread(target=self._set_playlists, args=(chosen_songs, keep_names)).start()
-
-    def _set_playlists(self, songs, keep_names):
-        set_playlists_for_songs(songs, keep_names)
-        self.root.after(0, lambda: (self.log_status("Playlists updated"), self.update_playlist_checks_for_song(), self.song_changer_search()))
+        self.loop.run_blocking(
+            set_playlists_for_songs, chosen_songs, keep_names,
+            on_done=lambda _: (self.log_status("Playlists updated"), self.update_playlist_checks_for_song(), self.song_changer_search()),
+            on_error=lambda e: self.log_status(f"Updating playlists failed: {e}"),
+        )
 
     def clear_playlists_selected_songs(self):
         selected = self.song_matches_listbox.curselection()
         if not selected:
             return
         chosen_songs = [self.song_matches_data[i] for i in selected]
+        # Remove from all playlists, writing each affected playlist once
+        with PlaylistTransaction(PLAYLIST_INDEX) as txn:
+            for song in chosen_songs:
+                for pl in song_playlists(song):
+                    txn.remove(pl, to_rel(song, PLAYLISTS))
         for song in chosen_songs:
-            # Remove from all playlists
-            for pl in song_playlists(song):
-                lines = pl.read_text(encoding="utf-8", errors="ignore").splitlines()
-                rel = os.path.relpath(song, PLAYLISTS).replace("\\", "/")
-                new_lines = [ln for ln in lines if ln.strip() and ln != rel]
-                pl.write_text("\n".join(new_lines), encoding="utf-8")
             # Tag with empty playlists
-            if song.suffix.lower() == ".mp3" and song.exists():
+            if is_taggable(song) and song.exists():
                 tag_song_with_playlists(str(song), [])
             # Move to TempDownloads if in AllSongs
             if song.parent == ALL_SONGS_PATH:
@@ -809,12 +1052,12 @@ class MusicGUI:
         pl_path = PLAYLISTS / f"{pl_name}.m3u"
         if not pl_path.exists():
             return
-        lines = pl_path.read_text(encoding="utf-8", errors="ignore").splitlines()
-        rel_paths = [ln.strip() for ln in lines if ln.strip() and not ln.startswith("#")]
+        rel_paths = PLAYLIST_INDEX.entries(pl_name)
+        known = set(library_songs())
         songs = []
         for rel in rel_paths:
             song_path = PLAYLISTS / rel
-            if song_path.exists() and is_audio(song_path):
+            if is_audio(song_path) and (song_path in known or song_path.exists()):
                 songs.append(song_path)
         self.cleanse_songs_listbox.delete(0, tk.END)
         self.cleanse_songs_data = songs
@@ -827,11 +1070,11 @@ class MusicGUI:
             return
         to_remove = [self.cleanse_songs_data[i] for i in selected]
         pl_name = self.cleanse_playlist_var.get()
-        rels_to_remove = [os.path.relpath(song, PLAYLISTS).replace("\\", "/") for song in to_remove]
+        rels_to_remove = {to_rel(song, PLAYLISTS) for song in to_remove}
         pl_path = PLAYLISTS / f"{pl_name}.m3u"
         lines = pl_path.read_text(encoding="utf-8", errors="ignore").splitlines()
         new_lines = [ln for ln in lines if ln not in rels_to_remove]
-        pl_path.write_text("\n".join(new_lines), encoding="utf-8")
+        PLAYLIST_INDEX.write(pl_path, new_lines)
         self.log_status(f"Removed {len(to_remove)} songs from {pl_name}")
         # Update tags and move if needed
         for song in to_remove:
@@ -840,28 +1083,27 @@ class MusicGUI:
                 new_path = TEMP_DOWNLOADS / song.name
                 if not new_path.exists():
                     # Tag before moving
-                    if song.suffix.lower() == ".mp3":
+                    if is_taggable(song):
                         tag_song_with_playlists(str(song), [])
                     shutil.move(str(song), str(new_path))
                     self.log_status(f"Moved {song.name} to TempDownloads")
                 else:
                     # Can't move, tag with empty
-                    if song.suffix.lower() == ".mp3":
+                    if is_taggable(song):
                         tag_song_with_playlists(str(song), [])
             else:
                 # Not moving, tag with empty playlists
-                if song.suffix.lower() == ".mp3":
+                if is_taggable(song):
                     tag_song_with_playlists(str(song), [])
 
     def bulk_search(self):
         term = self.bulk_search_entry.get().strip()
         if not term:
             return
-        threading.Thread(target=self._bulk_find_matches, args=(term,)).start()
+        self.live_search.submit("bulk", term, self.display_bulk_matches)
 
-    def _bulk_find_matches(self, term):
-        matches = find_song_matches(term)
-        self.root.after(0, self.display_bulk_matches, matches)
+    def _on_bulk_typed(self, *args):
+        self.live_search.schedule("bulk", self.bulk_search_entry.get().strip(), self.display_bulk_matches)
 
     def display_bulk_matches(self, matches):
         self.bulk_matches_listbox.delete(0, tk.END)
@@ -897,24 +1139,40 @@ class MusicGUI:
         self.log_status("Bulk add finished")
 
     def run_auto_clean(self):
-        threading.Thread(target=self._cleanup_orphaned_songs).start()
+        self.loop.run_blocking(self._cleanup_orphaned_songs, on_error=lambda e: self.log_status(f"Auto clean failed: {e}"))
+
+    def preview_auto_clean(self):
+        self.loop.run_blocking(self._cleanup_orphaned_songs, dry_run=True,
+                               on_error=lambda e: self.log_status(f"Auto clean preview failed: {e}"))
 
-    def _cleanup_orphaned_songs(self):
+    def _cleanup_orphaned_songs(self, dry_run=False):
         if not ALL_SONGS_PATH.exists():
             self.log_status("AllSongs folder not found.")
             return
-        moved_count = 0
-        for song_path in ALL_SONGS_PATH.glob("*"):
-            if song_path.is_file() and is_audio(song_path):
-                if not song_playlists(song_path):
-                    new_path = TEMP_DOWNLOADS / song_path.name
-                    if not new_path.exists():
-                        shutil.move(str(song_path), str(new_path))
-                        self.log_status(f"Moved {song_path.name} to TempDownloads (no playlists)")
-                        moved_count += 1
-                    else:
-                        self.log_status(f"Skipped {song_path.name} (already exists in TempDownloads)")
-        self.log_status(f"Auto clean completed. Moved {moved_count} orphaned songs.")
+        start = time.perf_counter()
+        orphans = find_orphaned_songs()
+        found_in = time.perf_counter() - start
+
+        if dry_run:
+            for song_path in orphans[:50]:
+                self.log_status(f"Would move {song_path.name} to TempDownloads")
+            if len(orphans) > 50:
+                self.log_status(f"... and {len(orphans) - 50} more")
+            self.log_status(f"Preview: {len(orphans)} orphaned songs found in {found_in:.2f}s. Nothing was moved.")
+            return
+
+        moved_count = skipped_count = 0
+        for song_path in orphans:
+            new_path = TEMP_DOWNLOADS / song_path.name
+            if not new_path.exists():
+                shutil.move(str(song_path), str(new_path))
+                self.log_status(f"Moved {song_path.name} to TempDownloads (no playlists)")
+                moved_count += 1
+            else:
+                self.log_status(f"Skipped {song_path.name} (already exists in TempDownloads)")
+                skipped_count += 1
+        self.log_status(f"Auto clean completed. Moved {moved_count} orphaned songs, skipped {skipped_count} "
+                        f"(found in {found_in:.2f}s, total {time.perf_counter() - start:.2f}s).")
 
     def _on_entry_focus_in(self, event):
         if self.url_entry.get() == "Enter URL or search query":
@@ -982,6 +1240,7 @@ class MusicGUI:
         self._reset_progress()
 
     def _reset_progress(self):
+        self._progress_version = None   # the next poll redraws whatever is still running
         self.progress_value = 0
         self.progress_text = "Ready"
         self.percent_label.config(text="0%")
@@ -1038,12 +1297,21 @@ class MusicGUI:
         global MAX_CONCURRENT
         try:
             MAX_CONCURRENT = int(self.max_concurrent_var.get())
-            messagebox.showinfo("Saved", f"Max concurrent set to {MAX_CONCURRENT}")
         except ValueError:
             messagebox.showerror("Error", "Invalid number")
+            return
+        # applies to downloads already queued too
+        GOVERNOR.adaptive = self.adaptive_var.get()
+        GOVERNOR.resize(MAX_CONCURRENT)
+        mode = " (adaptive)" if GOVERNOR.adaptive else ""
+        messagebox.showinfo("Saved", f"Max concurrent set to {GOVERNOR.limit}{mode}")
+
+    def _on_concurrency_change(self, old, new, reason):
+        self.log_status(f"Parallel downloads {old} -> {new} ({reason})")
+        self.root.after(0, self.max_concurrent_var.set, str(new))
 
     def save_settings(self):
-        global SONGS_FILE, TEMP_DIR, PLAYLISTS_DIR, ALL_SONGS, DEST_ROOT, ALL_SONGS_PATH, TEMP_DOWNLOADS, PLAYLISTS
+        global SONGS_FILE, TEMP_DIR, PLAYLISTS_DIR, ALL_SONGS, DEST_ROOT, ALL_SONGS_PATH, TEMP_DOWNLOADS, PLAYLISTS, PLAYLIST_INDEX, CATALOG, SEARCH_INDEX, QUEUE
         SONGS_FILE = self.songs_file_var.get()
         TEMP_DIR = self.temp_dir_var.get()
         PLAYLISTS_DIR = self.playlists_dir_var.get()
@@ -1052,10 +1320,19 @@ class MusicGUI:
         ALL_SONGS_PATH = DEST_ROOT / "AllSongs"
         TEMP_DOWNLOADS = DEST_ROOT.parent / "TempDownloads"
         PLAYLISTS = DEST_ROOT
+        PLAYLIST_INDEX = PlaylistIndex(PLAYLISTS)
         # Create directories if they don't exist
         os.makedirs(TEMP_DIR, exist_ok=True)
         os.makedirs(PLAYLISTS_DIR, exist_ok=True)
         os.makedirs(ALL_SONGS, exist_ok=True)
+        CATALOG.close()
+        CATALOG = LibraryCatalog(default_data_dir(PLAYLISTS) / "library.db", PLAYLISTS, [ALL_SONGS_PATH, TEMP_DOWNLOADS], watch=True)
+        SEARCH_INDEX = SongSearchIndex()
+        if QUEUE.db_path != default_data_dir(PLAYLISTS) / "downloads.db":
+            QUEUE.close()
+            QUEUE = DownloadQueue(default_data_dir(PLAYLISTS) / "downloads.db")
+        CATALOG.refresh()
+        PLAYLIST_INDEX.seed(CATALOG.playlist_snapshot())
         messagebox.showinfo("Saved", "Settings saved successfully")
 
     def open_songs_file(self):
@@ -1068,38 +1345,187 @@ def is_audio(path: Path) -> bool:
 
 def list_playlists() -> list[Path]:
     PLAYLISTS.mkdir(parents=True, exist_ok=True)
-    return sorted(PLAYLISTS.glob("*.m3u"))
-
-def find_song_matches(term: str):
-    all_songs = []
-    if ALL_SONGS_PATH.exists():
-        all_songs.extend([s for s in ALL_SONGS_PATH.glob("*") if s.is_file() and is_audio(s)])
-    if TEMP_DOWNLOADS.exists():
-        all_songs.extend([s for s in TEMP_DOWNLOADS.glob("*") if s.is_file() and is_audio(s)])
-    names = [s.stem for s in all_songs]
-
-    close = difflib.get_close_matches(term, names, n=15, cutoff=0.3)
-    matches = [s for s in all_songs if s.stem in close]
-
-    term_lower = term.lower()
-    substring_matches = [s for s in all_songs if term_lower in s.stem.lower()]
-
-    seen = set()
-    final = []
-    for s in matches + substring_matches:
-        if s not in seen:
-            seen.add(s)
-            final.append(s)
-    return final
+    return [PLAYLISTS / f"{name}.m3u" for name in playlist_names()]
+
+def playlist_names() -> list[str]:
+    CATALOG.refresh()
+    return CATALOG.playlists()
+
+def library_songs(dirs=None) -> list[Path]:
+    CATALOG.refresh()
+    return CATALOG.songs(dirs)
+
+def find_song_matches(term: str, within=None):
+    CATALOG.refresh()
+    if SEARCH_INDEX.generation != CATALOG.generation:
+        SEARCH_INDEX.sync(CATALOG.songs(), CATALOG.generation)
+    if within is not None:
+        return SEARCH_INDEX.search_within(term, within)
+    return SEARCH_INDEX.search(term)
+
+class BackgroundLoop:
+    """
+    One long-lived asyncio event loop on one daemon thread for all of the GUI's background work:
+    downloads, YouTube searches and file I/O (blocking calls run on the loop's bounded executor).
+    Tk handlers hand it work with submit() / run_blocking() and get the result back on the Tk
+    thread through root.after, so no handler starts threads or event loops of its own.
+    """
+
+    def __init__(self, root, io_workers=LOOP_IO_WORKERS):
+        self.root = root
+        self.loop = asyncio.new_event_loop()
+        self.loop.set_default_executor(ThreadPoolExecutor(max_workers=io_workers, thread_name_prefix="gui-io"))
+        threading.Thread(target=self._run, name="gui-loop", daemon=True).start()
+
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def submit(self, coro, on_done=None, on_error=None):
+        """Run `coro` on the loop. on_done(result) / on_error(exception) are called on the Tk thread."""
+        fut = asyncio.run_coroutine_threadsafe(coro, self.loop)
+        if on_done or on_error:
+            fut.add_done_callback(lambda f: self.root.after(0, self._deliver, f, on_done, on_error))
+        return fut
+
+    def run_blocking(self, func, *args, on_done=None, on_error=None, **kwargs):
+        """Run a blocking function on the loop's executor, same callbacks as submit()."""
+        return self.submit(asyncio.to_thread(func, *args, **kwargs), on_done, on_error)
+
+    @staticmethod
+    def _deliver(fut, on_done, on_error):
+        if fut.cancelled():
+            return
+        error = fut.exception()
+        if error is not None:
+            if on_error:
+                on_error(error)
+        elif on_done:
+            on_done(fut.result())
+
+class LiveSearch:
+    """
+    Search-as-you-type for the library search boxes. Keystrokes are debounced, every query goes
+    to one worker thread, a newer query for the same box replaces any that haven't started, and
+    only the newest query's results are delivered. A query that extends the previous one
+    ("queen" -> "queen bo") filters the previous results instead of searching the whole library.
+    """
+    DEBOUNCE_MS = 200
+
+    def __init__(self, root, log_func):
+        self.root = root
+        self.log_func = log_func
+        self._cond = threading.Condition()
+        self._pending = {}    # box -> (generation, term, callback) not started yet
+        self._latest = {}     # box -> newest generation
+        self._submitted = {}  # box -> newest term
+        self._previous = {}   # box -> (normalized term, catalog generation, results)
+        self._after_ids = {}
+        threading.Thread(target=self._worker, daemon=True).start()
+
+    def schedule(self, box, term, callback):
+        """Debounced submit, for keystrokes."""
+        if box in self._after_ids:
+            self.root.after_cancel(self._after_ids.pop(box))
+        self._after_ids[box] = self.root.after(self.DEBOUNCE_MS, self._fire, box, term, callback)
+
+    def _fire(self, box, term, callback):
+        self._after_ids.pop(box, None)
+        if term != self._submitted.get(box):
+            self.submit(box, term, callback)
+
+    def submit(self, box, term, callback):
+        """Search now (Enter / Search button / refresh after an edit)."""
+        if box in self._after_ids:
+            self.root.after_cancel(self._after_ids.pop(box))
+        with self._cond:
+            generation = self._latest.get(box, 0) + 1
+            self._latest[box] = generation
+            self._submitted[box] = term
+            self._pending[box] = (generation, term, callback)
+            self._cond.notify()
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                while not self._pending:
+                    self._cond.wait()
+                box, (generation, term, callback) = self._pending.popitem()
+            try:
+                results = self._search(box, term)
+            except Exception as e:
+                self.log_func(f"Search failed: {e}")
+                continue
+            self.root.after(0, self._deliver, box, generation, results, callback)
+
+    def _search(self, box, term):
+        norm = normalize(term)
+        if not norm:
+            return []
+        CATALOG.refresh()
+        prev = self._previous.get(box)
+        if prev and norm.startswith(prev[0]) and prev[1] == CATALOG.generation:
+            results = find_song_matches(term, within=prev[2])
+        else:
+            results = find_song_matches(term)
+        self._previous[box] = (norm, CATALOG.generation, results)
+        return results
+
+    def _deliver(self, box, generation, results, callback):
+        if generation == self._latest.get(box):
+            callback(results)
+
+def resolve_batch_line(line):
+    """
+    (title, search results) for a batch line; a URL resolves to a single result carrying its
+    title, and a playlist/channel URL to its videos and the list's title. Otherwise the title is the line.
+    """
+    if "http" in line and is_collection_url(line):
+        return expand_collection(line)
+    if "http" in line:
+        title = get_title_from_url(line)
+        return line, [{"title": title, "uploader": "N/A", "id": line.split("v=")[-1] if "v=" in line else line}]
+    return line, search_youtube_sync(line, max_results=5)
+
+class BatchPrefetcher:
+    """
+    Resolves the current batch line and the next PREFETCH_AHEAD ones on a small thread pool,
+    so Skip / Next usually finds its results ready. Lines that fall out of that window are
+    dropped, and reset() drops everything (reshuffle, new batch, batch finished).
+    """
+
+    def __init__(self, lookahead=PREFETCH_AHEAD, workers=PREFETCH_WORKERS):
+        self.lookahead = max(0, lookahead)
+        self._pool = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="prefetch")
+        self._futures = {}   # job id -> Future of (title, results)
+        self.generation = 0
+
+    def get(self, jobs, index):
+        """Future of jobs[index]'s results; also starts resolving the jobs after it."""
+        window = jobs[index:index + 1 + self.lookahead]
+        wanted = {job["id"] for job in window}
+        for job_id in list(self._futures):
+            if job_id not in wanted:
+                self._futures.pop(job_id).cancel()
+        for job in window:
+            if job["id"] not in self._futures:
+                self._futures[job["id"]] = self._pool.submit(resolve_batch_line, job["input"])
+        return self._futures[jobs[index]["id"]]
+
+    def reset(self):
+        for fut in self._futures.values():
+            fut.cancel()
+        self._futures.clear()
+        self.generation += 1
 
 def song_playlists(song_path: Path) -> list[Path]:
-    rel = os.path.relpath(song_path, PLAYLISTS).replace("\\", "/")
-    pls = []
-    for pl in list_playlists():
-        lines = pl.read_text(encoding="utf-8", errors="ignore").splitlines()
-        if rel in lines:
-            pls.append(pl)
-    return pls
+    rel = to_rel(song_path, PLAYLISTS)
+    return [PLAYLISTS / f"{name}.m3u" for name in PLAYLIST_INDEX.playlists_for(rel)]
+
+def find_orphaned_songs() -> list[Path]:
+    PLAYLIST_INDEX.refresh(force=True)
+    referenced = PLAYLIST_INDEX.all_entries()
+    return [s for s in library_songs([ALL_SONGS_PATH]) if to_rel(s, PLAYLISTS) not in referenced]
 
 def set_playlists_for_songs(song_paths: list[Path], keep_names: list[str]):
     all_pls = list_playlists()
@@ -1113,30 +1539,23 @@ def set_playlists_for_songs(song_paths: list[Path], keep_names: list[str]):
                     shutil.move(str(song_path), str(new_path))
                     song_paths[i] = new_path
 
-    for song_path in song_paths:
-        rel = os.path.relpath(song_path, PLAYLISTS).replace("\\", "/")
-
-        for pl in all_pls:
-            lines = pl.read_text(encoding="utf-8", errors="ignore").splitlines()
-            new_lines = [ln for ln in lines if ln.strip() and ln != rel]
-            if lines != new_lines:
-                pl.write_text("\n".join(new_lines), encoding="utf-8")
-
-        for pl in chosen:
-            lines = pl.read_text(encoding="utf-8", errors="ignore").splitlines() if pl.exists() else []
-            if not lines or lines[0] != "#EXTM3U":
-                lines.insert(0, "#EXTM3U")
-            if rel not in lines:
-                lines.append(rel)
-                pl.write_text("\n".join(lines), encoding="utf-8")
+    # One read and at most one write per playlist for the whole selection
+    with PlaylistTransaction(PLAYLIST_INDEX) as txn:
+        for song_path in song_paths:
+            rel = to_rel(song_path, PLAYLISTS)
+            for pl in all_pls:
+                if pl not in chosen:
+                    txn.remove(pl, rel)
+            for pl in chosen:
+                txn.add(pl, rel)
+        new_playlists = {song_path: txn.playlists_for(to_rel(song_path, PLAYLISTS)) for song_path in song_paths}
 
     for song_path in song_paths:
-        if song_path.suffix.lower() == ".mp3" and song_path.exists():
-            playlists = [pl.stem for pl in song_playlists(song_path)]
-            tag_song_with_playlists(str(song_path), playlists)
+        if is_taggable(song_path) and song_path.exists():
+            tag_song_with_playlists(str(song_path), new_playlists[song_path])
 
     for i, song_path in enumerate(song_paths):
-        if song_path.parent == ALL_SONGS_PATH and not song_playlists(song_path):
+        if song_path.parent == ALL_SONGS_PATH and not new_playlists[song_path]:
             new_path = TEMP_DOWNLOADS / song_path.name
             if not new_path.exists():
                 shutil.move(str(song_path), str(new_path))
@@ -1145,33 +1564,19 @@ def set_playlists_for_songs(song_paths: list[Path], keep_names: list[str]):
 def delete_song(song_path: Path):
     for pl in song_playlists(song_path):
         lines = pl.read_text(encoding="utf-8", errors="ignore").splitlines()
-        rel = os.path.relpath(song_path, PLAYLISTS).replace("\\", "/")
+        rel = to_rel(song_path, PLAYLISTS)
         new_lines = [ln for ln in lines if ln.strip() and ln != rel]
-        pl.write_text("\n".join(new_lines), encoding="utf-8")
+        PLAYLIST_INDEX.write(pl, new_lines)
     if song_path.exists():
         song_path.unlink()
 
-def tag_song_with_playlists(song_path: str, playlists: list[str], thumbnail_data=None, mime=None, uploader=None):
-    comment_text = ", ".join(playlists)
-
-    try:
-        tags = ID3(song_path)
-    except ID3NoHeaderError:
-        tags = ID3()
-
-    tags.delall("COMM")
-    tags.add(COMM(encoding=3, lang="eng", desc="", text=comment_text))
-
-    if thumbnail_data:
-        tags.add(APIC(encoding=3, mime=mime or 'image/jpeg', type=3, desc='Cover', data=thumbnail_data))
-
-    if uploader:
-        tags.add(TPE1(encoding=3, text=uploader))
-
-    tags.save(song_path, v2_version=3)
+def tag_song_with_playlists(song_path: str, playlists: list[str], thumbnail_data=None, mime=None, uploader=None,
+                            title=None, source_url=None):
+    if write_song_tags(song_path, playlists, thumbnail_data, mime, uploader, title, source_url):
+        CATALOG.song_changed(song_path)
 
 def add_songs_to_playlist(song_paths: list[Path], playlist_path: Path):
-    rels = [os.path.relpath(song_path, PLAYLISTS).replace("\\", "/") for song_path in song_paths]
+    rels = [to_rel(song_path, PLAYLISTS) for song_path in song_paths]
     # Ensure playlist file exists with header
     if not playlist_path.exists():
         playlist_path.write_text("#EXTM3U\n", encoding="utf-8")
@@ -1179,183 +1584,320 @@ def add_songs_to_playlist(song_paths: list[Path], playlist_path: Path):
     for rel in rels:
         with playlist_path.open("a", encoding="utf-8") as f:
             f.write('\n' + rel)
+    PLAYLIST_INDEX.record(playlist_path, playlist_path.read_text(encoding="utf-8", errors="ignore").splitlines())
 
 # Download functions adapted
+def get_video_info(url):
+    """Video info from yt-dlp without downloading (cached, and reused by the download)."""
+    info = META_CACHE.get(video_key(url), INFO_TTL)
+    if info is None:
+        with YDL_POOL.checkout(METADATA_OPTS) as ydl:
+            info = slim_info(ydl.extract_info(url, download=False))
+        META_CACHE.put(video_key(url), info)
+    return info
+
+def resume_info(url, log_func):
+    """Info for the tags of a resumed job; without it only playlists and source URL are written."""
+    try:
+        return get_video_info(url)
+    except Exception as e:
+        log_func(f"Could not fetch video info for {url}: {e}")
+        return {}
+
 def get_title_from_url(url):
     """Get title from URL using yt-dlp without downloading."""
-    opts = {"quiet": True, "skip_download": True}
-    with YoutubeDL(opts) as ydl:
-        info = ydl.extract_info(url, download=False)
-        return info.get("title", url)
+    return get_video_info(url).get("title", url)
 
 def search_youtube_sync(query, max_results=5):
-    opts = {"quiet": True, "skip_download": True, "extract_flat": "in_playlist"}
-    with YoutubeDL(opts) as ydl:
-        info = ydl.extract_info(f"ytsearch{max_results}:{query}", download=False)
-        return info.get("entries", [])
-
-async def download_song_gui(entry, playlist_names, log_func, update_func=None):
+    key = search_key(query, max_results)
+    entries = META_CACHE.get(key, SEARCH_TTL)
+    if entries is None:
+        with YDL_POOL.checkout(SEARCH_OPTS) as ydl:
+            info = ydl.extract_info(f"ytsearch{max_results}:{query}", download=False)
+        entries = [slim_info(e) for e in info.get("entries", [])]
+        META_CACHE.put(key, entries)
+    return entries
+
+# ------------------------
+# Download pipeline: download (network) -> transcode (ffmpeg) -> write (move, playlists, tags)
+# Each stage gets a job context and returns it for the next stage, or None once it failed.
+# ------------------------
+def gui_fetch_stage(ctx):
+    entry = ctx["entry"]
     url = entry["url"]
-    original_input = entry.get("input", url)
+    job_id = entry["id"]
+    log_func = ctx["log_func"]
     log_func(f"Starting download: {url}")
-    if update_func:
-        update_func(10, "Fetching video info")
-
-    ydl_opts = {
-        "outtmpl": os.path.join(TEMP_DIR, "%(id)s.%(ext)s"),
-        "quiet": True,
-        "no_warnings": True,
-        "noprogress": True,
-        "postprocessors": [{
-            "key": "FFmpegExtractAudio",
-            "preferredcodec": "mp3",
-        }],
-    }
+    PROGRESS.stage(job_id, job_progress.DOWNLOADING)
+
+    # Cover art starts downloading as soon as yt-dlp knows the video's info, alongside the audio
+    thumbnail = {}
+    def on_progress(d):
+        thumbnail_url = (d.get("info_dict") or {}).get("thumbnail")
+        if thumbnail_url and "future" not in thumbnail:
+            thumbnail["future"] = THUMBNAILS.prefetch(thumbnail_url)
 
-    loop = asyncio.get_running_loop()
     try:
-        if update_func:
-            update_func(20, "Downloading video")
-        info = await loop.run_in_executor(None, run_download, ydl_opts, url)
+        info = run_download(download_opts(TEMP_DIR, "%(id)s.%(ext)s"), url,
+                            [ctx["cancel"].progress_hook, on_progress, PROGRESS.progress_hook(job_id)])
     except Exception as e:
+        if ctx["cancel"].cancelled:
+            return None
         error_msg = str(e)
         if "Video unavailable" in error_msg:
             log_func(f"Error: Video is unavailable or private: {url}")
         elif "Unsupported URL" in error_msg:
             log_func(f"Error: Unsupported URL format: {url}")
-        elif "ffmpeg" in error_msg.lower():
-            log_func(f"Error: Audio conversion failed. Ensure ffmpeg is installed: {url}")
         else:
             log_func(f"Download failed: {error_msg}")
-        return
+        GOVERNOR.record_error(error_msg)
+        QUEUE.set_state(job_id, FAILED, error=error_msg)
+        return None
+
+    src = downloaded_path(info)
+    if not src:
+        log_func("Could not locate downloaded file in TempDownloads.")
+        QUEUE.set_state(job_id, FAILED, error="downloaded file not found")
+        return None
+    GOVERNOR.record(os.path.getsize(src))
+
+    if "future" not in thumbnail:
+        if info.get('thumbnail'):
+            thumbnail["future"] = THUMBNAILS.prefetch(info['thumbnail'])
+        else:
+            log_func("No thumbnail available for this video")
+    ctx.update(info=info, src=src, thumbnail=thumbnail.get("future"))
+    return ctx
 
-    src = info.get('filepath')
-    if not src or not os.path.exists(src):
-        # Try expected filename based on id
-        vid_id = info.get('id')
-        if vid_id:
-            expected = os.path.join(TEMP_DIR, f"{vid_id}.mp3")
-            if os.path.exists(expected):
-                src = expected
-            else:
-                log_func("Could not locate downloaded file in TempDownloads.")
-                return
+def gui_transcode_stage(ctx):
+    job_id = ctx["entry"]["id"]
+    log_func = ctx["log_func"]
+    info = ctx["info"]
+    QUEUE.set_state(job_id, CONVERTING)
+
+    src = ctx["src"]
+    try:
+        src = extract_audio(dict(info, filepath=src, ext=os.path.splitext(src)[1][1:]), AUDIO_CODEC,
+                            [PROGRESS.postprocessor_hook(job_id)], ctx["cancel"])
+    except Exception as e:
+        if ctx["cancel"].cancelled:
+            return None
+        if "ffmpeg" in str(e).lower() or "ffprobe" in str(e).lower():
+            log_func(f"Error: Audio conversion failed. Ensure ffmpeg is installed: {ctx['entry']['url']}")
         else:
-            log_func("Could not locate downloaded file in TempDownloads.")
-            return
+            log_func(f"Audio conversion failed: {e}")
+        QUEUE.set_state(job_id, FAILED, error=str(e))
+        return None
 
-    # Rename file to title if possible
-    if src.endswith('.mp3') and info.get('title'):
+    # Rename file to title if possible (keeping its extension: mp3, or opus/m4a in passthrough mode)
+    name_no_ext, ext = os.path.splitext(os.path.basename(src))
+    if ext.lower() in AUDIO_EXTS and info.get('title'):
         title = info['title']
         import re
         safe_title = re.sub(r'[<>:"/\\|?*]', '', title).strip()
-        if safe_title and safe_title != os.path.splitext(os.path.basename(src))[0]:
-            new_src = os.path.join(TEMP_DIR, f"{safe_title}.mp3")
+        if safe_title and safe_title != name_no_ext:
+            new_src = os.path.join(TEMP_DIR, f"{safe_title}{ext}")
             shutil.move(src, new_src)
             src = new_src
 
-    if update_func:
-        update_func(80, "Converting audio")
-
-    thumbnail_data = None
-    mime = None
-    if thumbnail_url := info.get('thumbnail'):
-        try:
-            thumbnail_data, mime = await asyncio.to_thread(download_thumbnail, thumbnail_url)
-        except Exception as e:
-            log_func(f"Failed to download thumbnail: {e}")
-    else:
-        log_func("No thumbnail available for this video")
-
-    uploader = info.get('uploader')
+    ctx["src"] = src
+    return ctx
 
+def gui_write_stage(ctx):
+    job_id = ctx["entry"]["id"]
+    playlist_names = ctx["playlists"]
+    log_func = ctx["log_func"]
+    src = ctx["src"]
     dst = src
+    PROGRESS.stage(job_id, job_progress.WRITING)
+    reused = ctx.get("existing", False)  # already in the library, nothing was downloaded
 
     if playlist_names:
         os.makedirs(ALL_SONGS, exist_ok=True)
 
-        base = os.path.basename(src)
-        name_no_ext, ext = os.path.splitext(base)
-        dst = os.path.join(ALL_SONGS, base)
-        i = 2
-        while os.path.exists(dst):
-            dst = os.path.join(ALL_SONGS, f"{name_no_ext} ({i}){ext}")
-            i += 1
-
-        try:
-            if update_func:
-                update_func(90, "Moving file")
-            await asyncio.to_thread(shutil.move, src, dst)
-            log_func(f"Moved {os.path.basename(dst)} into AllSongs")
-        except Exception as e:
-            log_func(f"Error moving file into AllSongs: {e}")
-            return
+        if not in_dir(src, ALL_SONGS):   # a reused or resumed song may already be there
+            base = os.path.basename(src)
+            name_no_ext, ext = os.path.splitext(base)
+            dst = os.path.join(ALL_SONGS, base)
+            i = 2
+            while os.path.exists(dst):
+                dst = os.path.join(ALL_SONGS, f"{name_no_ext} ({i}){ext}")
+                i += 1
 
-        if update_func:
-            update_func(95, "Updating playlists")
+            try:
+                shutil.move(src, dst)
+                log_func(f"Moved {os.path.basename(dst)} into AllSongs")
+            except Exception as e:
+                log_func(f"Error moving file into AllSongs: {e}")
+                QUEUE.set_state(job_id, FAILED, error=str(e))
+                return None
+            if reused:
+                CATALOG.song_moved(src, dst)
+
+        member_of = []
+        if reused or dst == src:   # already in the library: skip the playlists it is in
+            CATALOG.refresh()
+            member_of = CATALOG.playlists_for(to_rel(dst, PLAYLISTS_DIR))
         for pl in playlist_names:
             pl_path = os.path.join(PLAYLISTS_DIR, f"{pl}.m3u")
             rel = os.path.relpath(dst, PLAYLISTS_DIR).replace("\\", "/")
 
             try:
                 if not os.path.exists(pl_path):
-                    async with aiofiles.open(pl_path, "w", encoding="utf-8") as f:
-                        await f.write("#EXTM3U\n")
+                    with open(pl_path, "w", encoding="utf-8") as f:
+                        f.write("#EXTM3U\n")
                 else:
                     try:
-                        async with aiofiles.open(pl_path, "r", encoding="utf-8") as f:
-                            content = await f.read()
+                        with open(pl_path, "r", encoding="utf-8") as f:
+                            content = f.read()
                     except UnicodeDecodeError:
-                        async with aiofiles.open(pl_path, "r", encoding="cp1252") as f:
-                            content = await f.read()
+                        with open(pl_path, "r", encoding="cp1252") as f:
+                            content = f.read()
                     existing = content.splitlines()
                     if rel not in existing:
                         if not content.endswith('\n'):
                             content += '\n'
                         content += rel + '\n'
-                        async with aiofiles.open(pl_path, "w", encoding="utf-8") as f:
-                            await f.write(content)
+                        with open(pl_path, "w", encoding="utf-8") as f:
+                            f.write(content)
+                        PLAYLIST_INDEX.record(pl_path, content.splitlines())
                 log_func(f"Added {os.path.basename(dst)} to {pl}.m3u")
             except Exception as e:
                 log_func(f"Error adding to playlist {pl}: {e}")
 
-        if update_func:
-            update_func(100, "Tagging file")
-        tag_song_with_playlists(dst, playlist_names, thumbnail_data, mime, uploader)
+    if reused:
+        # keep the song's other playlists in its comment; cover, artist and title are already there
+        if playlist_names:
+            tag_song_with_playlists(dst, member_of + [pl for pl in playlist_names if pl not in member_of])
+        QUEUE.set_state(job_id, DONE, path=dst)
+        log_func(f"Already downloaded, reused: {os.path.basename(dst)}")
+        return dst
+
+    # the thumbnail was fetched while the audio downloaded and converted
+    thumbnail_data = None
+    mime = None
+    if ctx["thumbnail"] is not None:
+        try:
+            thumbnail_data, mime = ctx["thumbnail"].result()
+        except Exception as e:
+            log_func(f"Failed to download thumbnail: {e}")
 
-    # Tag MP3 even if no playlists selected (for TempDownloads)
-    if not playlist_names:
-        tag_song_with_playlists(dst, [], thumbnail_data, mime, uploader)
+    QUEUE.set_state(job_id, TAGGING, path=dst)
+    # Tag the song with playlist information (empty list for TempDownloads)
+    info = ctx["info"]
+    tag_song_with_playlists(dst, playlist_names, thumbnail_data, mime, info.get('uploader'),
+                            info.get('title'), info.get('webpage_url') or ctx["entry"]["url"])
 
-    await remove_from_txt(original_input)
+    QUEUE.set_state(job_id, DONE)
     log_func(f"Finished download and processing: {os.path.basename(dst)}")
-    if update_func:
-        update_func(100, "Complete")
+    return dst
+
+# Every download (single, batch, resumed) goes through this one limit; Settings resizes it live
+GOVERNOR = Governor(DOWNLOAD_WORKERS, adaptive=ADAPTIVE_DOWNLOADS)
+PIPELINE = Pipeline([
+    Stage("download", gui_fetch_stage, governor=GOVERNOR),
+    Stage("transcode", gui_transcode_stage, TRANSCODE_WORKERS),
+    Stage("write", gui_write_stage, download_pipeline.WRITER_WORKERS),
+])
+
+async def download_song_gui(entry, playlist_names, log_func, priority=PRIORITY_NORMAL):
+    """
+    Queue a job (already in the downloading state) on the pipeline and wait until it leaves it.
+    Lower `priority` values start downloading first; cancel_download() stops the job.
+    """
+    job_id = entry["id"]
+    token = CANCEL_TOKENS[job_id] = CancelToken()
+    PROGRESS.start(job_id, entry["input"])
+    ctx = {"entry": entry, "playlists": playlist_names, "log_func": log_func, "cancel": token}
+    result = None
+    try:
+        if entry["state"] == TAGGING:
+            # interrupted after the move and playlist writes (QUEUE.recover): only the tags are left
+            info = await asyncio.to_thread(resume_info, entry["url"], log_func)
+            ctx.update(src=entry["path"], info=info, resumed=True,
+                       thumbnail=THUMBNAILS.prefetch(info["thumbnail"]) if info.get("thumbnail") else None)
+            fut = await asyncio.to_thread(PIPELINE.submit, ctx, "write", priority, token)
+        else:
+            existing = await asyncio.to_thread(downloaded_song, entry["url"])
+            if existing:
+                # skip download and transcode: the writer only adds the library file to the playlists
+                log_func(f"Already in the library: {os.path.basename(existing)}")
+                ctx.update(src=existing, existing=True)
+                fut = await asyncio.to_thread(PIPELINE.submit, ctx, "write", priority, token)
+            else:
+                fut = PIPELINE.submit(ctx, priority=priority, token=token)
+        result = await asyncio.wrap_future(fut)
+    except Exception as e:
+        log_func(f"Download failed: {e}")
+        QUEUE.set_state(job_id, FAILED, error=str(e))
+    finally:
+        CANCEL_TOKENS.pop(job_id, None)
+
+    if result is None and token.cancelled:
+        # partial download / conversion; a reused library file is never touched
+        extra = [ctx["src"]] if "src" in ctx and not (ctx.get("existing") or ctx.get("resumed")) else []
+        removed = await asyncio.to_thread(remove_partial_files, TEMP_DIR, video_id_from_url(entry["url"]), extra)
+        QUEUE.set_state(job_id, CANCELLED)
+        log_func(f"Cancelled: {entry['input']}" + (f" (removed {len(removed)} partial file(s))" if removed else ""))
+    PROGRESS.finish(job_id, ok=result is not None, cancelled=token.cancelled and result is None)
+
+def cancel_download(job_id) -> bool:
+    """Stop a queued or running job (any thread). False if it already left the pipeline."""
+    token = CANCEL_TOKENS.get(job_id)
+    if token is None:
+        return False
+    token.cancel()
+    PIPELINE.discard_cancelled()
+    return True
+
+async def download_songs_gui(entries, playlist_names, log_func):
+    """Run several queued jobs through the pipeline at once (e.g. the videos of a playlist)."""
+    await asyncio.gather(*(download_song_gui(entry, playlist_names, log_func) for entry in entries))
+
+def report_given_up(log_func):
+    """Name the failed jobs that are no longer retried, so they are not dropped silently."""
+    jobs = QUEUE.given_up()
+    if jobs:
+        names = ", ".join(job["input"] for job in jobs[:5]) + (", ..." if len(jobs) > 5 else "")
+        log_func(f"{len(jobs)} song(s) failed {MAX_ATTEMPTS} times and are no longer retried "
+                 f"(add the line to songs.txt again to retry): {names}")
 
 async def process_links_gui(log_func):
-    try:
-        async with aiofiles.open(SONGS_FILE, "r", encoding="utf-8") as f:
-            lines = await f.readlines()
-    except UnicodeDecodeError:
-        async with aiofiles.open(SONGS_FILE, "r", encoding="cp1252") as f:
-            lines = await f.readlines()
-    except FileNotFoundError:
-        log_func("No songs.txt found; nothing to do.")
+    await asyncio.to_thread(QUEUE.import_file, SONGS_FILE)
+    report_given_up(log_func)
+    jobs = QUEUE.jobs(PENDING)
+    if not jobs:
+        log_func("No songs in songs.txt or the queue; nothing to do.")
         return
 
-    links = [l.strip() for l in lines if "http" in l]
-    queries = [l.strip() for l in lines if "http" not in l and l.strip()]
+    links = [job for job in jobs if "http" in job["input"]]
+    queries = [job for job in jobs if "http" not in job["input"]]
 
     tasks = []
-    for url in links:
+    for job in links:
+        url = job["input"]
+        if is_collection_url(url):
+            try:
+                title, videos = await asyncio.to_thread(expand_collection, url)
+            except Exception as e:
+                log_func(f"Could not read the list {url}: {e}")
+                QUEUE.set_state(job["id"], FAILED, error=str(e))
+                continue
+            entries, skipped = await asyncio.to_thread(queue_videos, QUEUE, CATALOG, videos, [])
+            log_func(f"Queued {len(entries)} video(s) from {title} ({skipped} skipped)")
+            QUEUE.set_state(job["id"], DONE)
+            tasks.extend(asyncio.create_task(limit_downloads(entry, [], log_func)) for entry in entries)
+            continue
         title = await asyncio.to_thread(get_title_from_url, url)
         log_func(f"Processing: {title}")
         # For batch, assume no playlists or prompt? For simplicity, no playlists for batch
         playlist_names = []  # Could add GUI for this, but for now empty
-        entry = {"url": url, "input": url}
+        QUEUE.set_state(job["id"], DOWNLOADING, url=url, playlists=playlist_names)
+        entry = QUEUE.get(job["id"])
         tasks.append(asyncio.create_task(limit_downloads(entry, playlist_names, log_func)))
 
-    for query in queries:
+    for job in queries:
+        query = job["input"]
         results = await search_youtube(query, max_results=5)
         if not results:
             log_func(f"No results for: {query}")
@@ -1364,27 +1906,41 @@ async def process_links_gui(log_func):
         # For batch, take first result automatically
         sel = results[0]
         playlist_names = []
-        entry = {"url": f"https://www.youtube.com/watch?v={sel.get('id')}", "input": query}
+        QUEUE.set_state(job["id"], DOWNLOADING, url=f"https://www.youtube.com/watch?v={sel.get('id')}", playlists=playlist_names)
+        entry = QUEUE.get(job["id"])
         tasks.append(asyncio.create_task(limit_downloads(entry, playlist_names, log_func)))
 
     if tasks:
         await asyncio.gather(*tasks)
 
-sem = asyncio.Semaphore(MAX_CONCURRENT)
 async def limit_downloads(entry, playlist_names, log_func):
-    async with sem:
-        await download_song_gui(entry, playlist_names, log_func)
+    await download_song_gui(entry, playlist_names, log_func)
 
-def run_download(ydl_opts, url):
-    with YoutubeDL(ydl_opts) as ydl:
+def run_download(ydl_opts, url, progress_hooks=()):
+    with YDL_POOL.checkout(ydl_opts, progress_hooks=progress_hooks) as ydl:
+        # info resolved moments ago (title lookup / batch preview) skips a second extraction
+        cached = META_CACHE.get(video_key(url), INFO_TTL)
+        if cached is not None:
+            try:
+                return ydl.process_ie_result(cached, download=True)
+            except DownloadCancelled:
+                raise
+            except Exception:
+                pass  # e.g. its stream URLs expired; extract again below
         info = ydl.extract_info(url, download=True)
         return info
 
-def download_thumbnail(url):
-    with urllib.request.urlopen(url) as response:
-        data = response.read()
-        mime = response.headers.get('content-type', 'image/jpeg')
-        return data, mime
+def downloaded_song(url):
+    """Path of the library song already downloaded from this video (downloaded-video archive), or None."""
+    video_id = video_id_from_url(url)
+    if not video_id:
+        return None
+    CATALOG.refresh()
+    path = CATALOG.find_downloaded(video_id)
+    return str(path) if path else None
+
+def in_dir(path, folder):
+    return os.path.normcase(os.path.dirname(os.path.abspath(path))) == os.path.normcase(os.path.abspath(folder))
 
 def find_downloaded_file_from_info(info):
     title = info.get("title") or ""
@@ -1406,21 +1962,6 @@ def find_downloaded_file_from_info(info):
 
     return None
 
-async def remove_from_txt(original_line):
-    if not os.path.exists(SONGS_FILE):
-        return
-    try:
-        async with aiofiles.open(SONGS_FILE, "r", encoding="utf-8") as f:
-            lines = await f.readlines()
-    except Exception:
-        lines = []
-
-    target = (original_line or "").strip()
-    async with aiofiles.open(SONGS_FILE, "w", encoding="utf-8") as f:
-        for line in lines:
-            if line.strip() and line.strip() != target:
-                await f.write(line)
-
 async def search_youtube(query, max_results=5):
     loop = asyncio.get_running_loop()
     return await loop.run_in_executor(None, search_youtube_sync, query, max_results)
@@ -1,5 +1,6 @@
-import os, shutil, hashlib
+import os, shutil
 from pathlib import Path
+from library_catalog import LibraryCatalog, default_data_dir
 
 # Load .env
 def load_env():
@@ -26,22 +27,19 @@ WRITE_EXTM3U      = True
 NORMALIZE_SLASHES = True
 # ==========================
 
+# Separate db from the GUI's: this layout keeps playlists in DEST_ROOT/Playlists
+CATALOG = LibraryCatalog(default_data_dir(DEST_ROOT) / "sort_library.db", PLAYLISTS, [ALL_SONGS])
+
 def is_audio(path: Path) -> bool:
     return path.suffix.lower() in AUDIO_EXTS
 
-def sha1_file(path: Path, bufsize: int = 1024 * 1024) -> str:
-    h = hashlib.sha1()
-    with path.open("rb") as f:
-        for chunk in iter(lambda: f.read(bufsize), b""):
-            h.update(chunk)
-    return h.hexdigest()
-
-def unique_dest_path(base_dir: Path, filename: str) -> Path:
+def unique_dest_path(base_dir: Path, filename: str, taken: set[str] = None) -> Path:
+    """First free name in base_dir; `taken` (names already there, from the catalog) avoids a stat per try."""
     stem = Path(filename).stem
     ext  = Path(filename).suffix
     candidate = base_dir / f"{stem}{ext}"
     i = 2
-    while candidate.exists():
+    while (candidate.name in taken) if taken is not None else candidate.exists():
         candidate = base_dir / f"{stem} ({i}){ext}"
         i += 1
     return candidate
@@ -101,18 +99,30 @@ def main():
 
     print(f"Found {len(to_process)} audio file(s).")
 
+    CATALOG.refresh()
+    taken = {p.name for p in CATALOG.songs()}
+
     for src, playlist_name in to_process:
         print(f"\nProcessing: {src.relative_to(SOURCE_ROOT)}")
 
         try:
-            _ = sha1_file(src)
+            dup = CATALOG.find_duplicate(src)
         except Exception as e:
             print(f" ! Skipping unreadable file: {src} ({e})")
             continue
 
-        dest = unique_dest_path(ALL_SONGS, src.name)
-        shutil.move(str(src), str(dest))
-        print(f"   ➡️ Moved to {dest}")
+        if dup is not None:
+            # byte-identical to a song we already have: just link it, don't store another copy
+            src.unlink()
+            dest = dup
+            print(f"   ♻️ Duplicate of {dest.name}, not copied")
+        else:
+            dest = unique_dest_path(ALL_SONGS, src.name, taken)
+            shutil.move(str(src), str(dest))
+            taken.add(dest.name)
+            CATALOG.song_changed(dest)
+            CATALOG.record_hash(dest)
+            print(f"   ➡️ Moved to {dest}")
 
         rel = os.path.relpath(dest, PLAYLISTS)
         if NORMALIZE_SLASHES:
@@ -120,6 +130,7 @@ def main():
 
         update_playlist(playlist_name, rel)
 
+    CATALOG.refresh()
     print("\nDone.")
 
 if __name__ == "__main__":
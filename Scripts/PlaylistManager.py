@@ -1,8 +1,11 @@
 import os
 import shutil
+import time
 from pathlib import Path
-import difflib
-from mutagen.id3 import ID3, COMM, ID3NoHeaderError
+from tagging import write_song_tags, is_taggable
+from playlist_index import PlaylistIndex, PlaylistTransaction, to_rel
+from library_catalog import LibraryCatalog, default_data_dir
+from song_search import SongSearchIndex
 
 # Load .env
 def load_env():
@@ -26,6 +29,10 @@ PLAYLISTS   = DEST_ROOT
 AUDIO_EXTS = {".mp3", ".flac", ".m4a", ".aac", ".wav", ".ogg", ".opus", ".wma", ".aiff", ".alac"}
 # ==========================
 
+PLAYLIST_INDEX = PlaylistIndex(PLAYLISTS)
+CATALOG = LibraryCatalog(default_data_dir(PLAYLISTS) / "library.db", PLAYLISTS, [ALL_SONGS, TEMP_DOWNLOADS], watch=True)
+SEARCH_INDEX = SongSearchIndex()
+
 
 def is_audio(path: Path) -> bool:
     return path.suffix.lower() in AUDIO_EXTS
@@ -33,45 +40,29 @@ def is_audio(path: Path) -> bool:
 
 def list_playlists() -> list[Path]:
     PLAYLISTS.mkdir(parents=True, exist_ok=True)
-    return sorted(PLAYLISTS.glob("*.m3u"))
+    CATALOG.refresh()
+    return [PLAYLISTS / f"{name}.m3u" for name in CATALOG.playlists()]
+
+
+def library_songs(dirs=None) -> list[Path]:
+    """Audio files in AllSongs/TempDownloads (or just `dirs`), from the catalog."""
+    CATALOG.refresh()
+    return CATALOG.songs(dirs)
 
 
 def find_song_matches(term: str):
     """Fuzzy search songs in AllSongs and TempDownloads."""
-    all_songs = []
-    if ALL_SONGS.exists():
-        all_songs.extend([s for s in ALL_SONGS.glob("*") if s.is_file() and is_audio(s)])
-    if TEMP_DOWNLOADS.exists():
-        all_songs.extend([s for s in TEMP_DOWNLOADS.glob("*") if s.is_file() and is_audio(s)])
-    names = [s.stem for s in all_songs]
-
-    # Use difflib to get close matches
-    close = difflib.get_close_matches(term, names, n=15, cutoff=0.3)  # generous
-    matches = [s for s in all_songs if s.stem in close]
-
-    # Also include substring matches
-    term_lower = term.lower()
-    substring_matches = [s for s in all_songs if term_lower in s.stem.lower()]
-
-    # Merge results without duplicates
-    seen = set()
-    final = []
-    for s in matches + substring_matches:
-        if s not in seen:
-            seen.add(s)
-            final.append(s)
-    return final
+    CATALOG.refresh()
+    # Only re-sync the trigram index when the catalog saw songs added/moved/deleted
+    if SEARCH_INDEX.generation != CATALOG.generation:
+        SEARCH_INDEX.sync(CATALOG.songs(), CATALOG.generation)
+    return SEARCH_INDEX.search(term)
 
 
 def song_playlists(song_path: Path) -> list[Path]:
     """Return list of playlist files that contain the song."""
-    rel = os.path.relpath(song_path, PLAYLISTS).replace("\\", "/")
-    pls = []
-    for pl in list_playlists():
-        lines = pl.read_text(encoding="utf-8", errors="ignore").splitlines()
-        if rel in lines:
-            pls.append(pl)
-    return pls
+    rel = to_rel(song_path, PLAYLISTS)
+    return [PLAYLISTS / f"{name}.m3u" for name in PLAYLIST_INDEX.playlists_for(rel)]
 
 
 def set_playlists_for_songs(song_paths: list[Path], keep_indices: list[int]):
@@ -91,38 +82,31 @@ def set_playlists_for_songs(song_paths: list[Path], keep_indices: list[int]):
                 else:
                     print(f"⚠️ {song_path.name} already exists in AllSongs, skipping move")
 
-    for song_path in song_paths:
-        rel = os.path.relpath(song_path, PLAYLISTS).replace("\\", "/")
-
-        # Remove from all others
-        for pl in all_pls:
-            lines = pl.read_text(encoding="utf-8", errors="ignore").splitlines()
-            new_lines = [ln for ln in lines if ln.strip() and ln != rel]
-            if lines != new_lines:
-                pl.write_text("\n".join(new_lines), encoding="utf-8")
-                if pl not in chosen:
+    # Apply every edit in memory; each changed playlist is written once when the block exits
+    with PlaylistTransaction(PLAYLIST_INDEX) as txn:
+        for song_path in song_paths:
+            rel = to_rel(song_path, PLAYLISTS)
+
+            # Remove from all others
+            for pl in all_pls:
+                if pl not in chosen and txn.remove(pl, rel):
                     print(f"🗑 Removed {song_path.name} from {pl.stem}")
 
-        # Add to chosen
-        for pl in chosen:
-            lines = pl.read_text(encoding="utf-8", errors="ignore").splitlines() if pl.exists() else []
-            if not lines or lines[0] != "#EXTM3U":
-                if not lines or lines[0].strip() != "#EXTM3U":
-                    lines.insert(0, "#EXTM3U")
-            if rel not in lines:
-                lines.append(rel)
-                pl.write_text("\n".join(lines), encoding="utf-8")
-                print(f"✅ Added {song_path.name} to {pl.stem}")
-
-    # Update MP3 comments with current playlists
+            # Add to chosen
+            for pl in chosen:
+                if txn.add(pl, rel):
+                    print(f"✅ Added {song_path.name} to {pl.stem}")
+
+        new_playlists = {song_path: txn.playlists_for(to_rel(song_path, PLAYLISTS)) for song_path in song_paths}
+
+    # Update song comments with current playlists
     for song_path in song_paths:
-        if song_path.suffix.lower() == ".mp3":
-            playlists = [pl.stem for pl in song_playlists(song_path)]
-            tag_song_with_playlists(str(song_path), playlists)
+        if is_taggable(song_path):
+            tag_song_with_playlists(str(song_path), new_playlists[song_path])
 
     # Move songs with no playlists from AllSongs to TempDownloads
     for i, song_path in enumerate(song_paths):
-        if song_path.parent == ALL_SONGS and not song_playlists(song_path):
+        if song_path.parent == ALL_SONGS and not new_playlists[song_path]:
             new_path = TEMP_DOWNLOADS / song_path.name
             if not new_path.exists():
                 shutil.move(str(song_path), str(new_path))
@@ -136,9 +120,9 @@ def delete_song(song_path: Path):
     # Remove from all playlists
     for pl in song_playlists(song_path):
         lines = pl.read_text(encoding="utf-8", errors="ignore").splitlines()
-        rel = os.path.relpath(song_path, PLAYLISTS).replace("\\", "/")
+        rel = to_rel(song_path, PLAYLISTS)
         new_lines = [ln for ln in lines if ln.strip() and ln != rel]
-        pl.write_text("\n".join(new_lines), encoding="utf-8")
+        PLAYLIST_INDEX.write(pl, new_lines)
     # Delete from AllSongs
     if song_path.exists():
         song_path.unlink()
@@ -147,37 +131,51 @@ def delete_song(song_path: Path):
 
 def tag_song_with_playlists(song_path: str, playlists: list[str]):
     """
-    Writes all playlist names into the comment field of the MP3.
+    Writes all playlist names into the comment field of the song (in place when the tag has room).
     """
     comment_text = ", ".join(playlists)
+    if not write_song_tags(song_path, playlists):
+        return
+    CATALOG.song_changed(song_path)
 
-    try:
-        tags = ID3(song_path)
-    except ID3NoHeaderError:
-        tags = ID3()  # create new ID3 tag block if missing
-
-    tags.delall("COMM")  # remove old comments
-    tags.add(COMM(encoding=3, lang="eng", desc="", text=comment_text))
+    print(f"✅ {os.path.basename(song_path)} → {comment_text}")
 
-    # Save in ID3v2.3 (most compatible with Explorer/Foobar)
-    tags.save(song_path, v2_version=3)
 
-    print(f"✅ {os.path.basename(song_path)} → {comment_text}")
+def find_orphaned_songs() -> list[Path]:
+    """Songs in AllSongs that no playlist references: one set difference, no per-song playlist reads."""
+    PLAYLIST_INDEX.refresh(force=True)
+    referenced = PLAYLIST_INDEX.all_entries()
+    return [s for s in library_songs([ALL_SONGS]) if to_rel(s, PLAYLISTS) not in referenced]
 
 
-def cleanup_orphaned_songs():
-    """Move songs from AllSongs to TempDownloads if they have no playlists."""
+def cleanup_orphaned_songs(dry_run: bool = False):
+    """Move songs from AllSongs to TempDownloads if they have no playlists (dry_run only lists them)."""
     if not ALL_SONGS.exists():
         return
-    for song_path in ALL_SONGS.glob("*"):
-        if song_path.is_file() and is_audio(song_path):
-            if not song_playlists(song_path):
-                new_path = TEMP_DOWNLOADS / song_path.name
-                if not new_path.exists():
-                    shutil.move(str(song_path), str(new_path))
-                    print(f"📁 Moved {song_path.name} from AllSongs to TempDownloads (no playlists)")
-                else:
-                    print(f"⚠️ {song_path.name} already exists in TempDownloads, skipping move")
+    start = time.perf_counter()
+    orphans = find_orphaned_songs()
+    found_in = time.perf_counter() - start
+
+    if dry_run:
+        for song_path in orphans:
+            print(f"📁 Would move {song_path.name} from AllSongs to TempDownloads (no playlists)")
+        print(f"🔎 {len(orphans)} orphaned songs found in {found_in:.2f}s (preview, nothing moved)")
+        return
+
+    TEMP_DOWNLOADS.mkdir(parents=True, exist_ok=True)
+    moved = skipped = 0
+    for song_path in orphans:
+        new_path = TEMP_DOWNLOADS / song_path.name
+        if not new_path.exists():
+            shutil.move(str(song_path), str(new_path))
+            print(f"📁 Moved {song_path.name} from AllSongs to TempDownloads (no playlists)")
+            moved += 1
+        else:
+            print(f"⚠️ {song_path.name} already exists in TempDownloads, skipping move")
+            skipped += 1
+    if orphans:
+        print(f"🧹 {len(orphans)} orphaned songs: moved {moved}, skipped {skipped} "
+              f"(found in {found_in:.2f}s, total {time.perf_counter() - start:.2f}s)")
 
 
 def create_new_playlist():
@@ -187,20 +185,21 @@ def create_new_playlist():
     pl_path = PLAYLISTS / f"{name}.m3u"
     if not pl_path.exists():
         pl_path.write_text("#EXTM3U\n", encoding="utf-8")
+        PLAYLIST_INDEX.record(pl_path, [])
         print(f"📁 Created new playlist: {name}")
     return pl_path
 
 
 def add_songs_to_playlist(song_paths: list[Path], playlist_path: Path):
     """Add songs to a specific playlist."""
-    rels = [os.path.relpath(song_path, PLAYLISTS).replace("\\", "/") for song_path in song_paths]
+    rels = [to_rel(song_path, PLAYLISTS) for song_path in song_paths]
     lines = playlist_path.read_text(encoding="utf-8", errors="ignore").splitlines() if playlist_path.exists() else []
     if not lines or lines[0] != "#EXTM3U":
         lines.insert(0, "#EXTM3U")
     for rel in rels:
         if rel not in lines:
             lines.append(rel)
-    playlist_path.write_text("\n".join(lines), encoding="utf-8")
+    PLAYLIST_INDEX.write(playlist_path, lines)
     print(f"✅ Added {len(song_paths)} songs to {playlist_path.stem}")
 
 
@@ -300,9 +299,10 @@ def playlist_cleanse():
         return
 
     # Get songs in playlist
+    pl_entries = set(PLAYLIST_INDEX.entries(pl.stem))
     songs_in_pl = []
-    for song in (list(ALL_SONGS.glob("*")) if ALL_SONGS.exists() else []) + (list(TEMP_DOWNLOADS.glob("*")) if TEMP_DOWNLOADS.exists() else []):
-        if is_audio(song) and pl in song_playlists(song):
+    for song in library_songs():
+        if to_rel(song, PLAYLISTS) in pl_entries:
             songs_in_pl.append(song)
 
     if not songs_in_pl:
@@ -326,10 +326,10 @@ def playlist_cleanse():
         return
 
     # Remove from playlist
-    rels_to_remove = [os.path.relpath(song, PLAYLISTS).replace("\\", "/") for song in to_remove]
+    rels_to_remove = {to_rel(song, PLAYLISTS) for song in to_remove}
     lines = pl.read_text(encoding="utf-8", errors="ignore").splitlines()
     new_lines = [ln for ln in lines if ln not in rels_to_remove]
-    pl.write_text("\n".join(new_lines), encoding="utf-8")
+    PLAYLIST_INDEX.write(pl, new_lines)
     print(f"🗑 Removed {len(to_remove)} songs from {pl.stem}")
 
     # Move to TempDownloads if no playlists left
@@ -345,7 +345,7 @@ def playlist_cleanse():
 
     # Update tags
     for song in to_remove:
-        if song.suffix.lower() == ".mp3":
+        if is_taggable(song):
             playlists = [p.stem for p in song_playlists(song)]
             tag_song_with_playlists(str(song), playlists)
 
@@ -416,7 +416,7 @@ def playlist_bulk():
 
         # Update tags
         for song in chosen_songs:
-            if song.suffix.lower() == ".mp3":
+            if is_taggable(song):
                 playlists = [p.stem for p in song_playlists(song)]
                 tag_song_with_playlists(str(song), playlists)
 
@@ -426,6 +426,10 @@ def main():
         print(f"ERROR: Neither AllSongs nor TempDownloads folders found: {ALL_SONGS}, {TEMP_DOWNLOADS}")
         return
 
+    # Load the catalog (only changed folders/playlists are re-read) and warm the playlist index from it
+    CATALOG.refresh()
+    PLAYLIST_INDEX.seed(CATALOG.playlist_snapshot())
+
     # Clean up orphaned songs at startup
     cleanup_orphaned_songs()
 
@@ -434,7 +438,8 @@ def main():
         print("1. Song Changer - Search all songs, manage playlists")
         print("2. Playlist Cleanse - Remove songs from a specific playlist")
         print("3. Playlist Bulk - Add songs to a playlist with multiple queries")
-        choice = input("Choose option (1-3, or 'q' to quit): ").strip()
+        print("4. Orphan Cleanup - Preview/move songs that are in no playlist")
+        choice = input("Choose option (1-4, or 'q' to quit): ").strip()
 
         if choice.lower() == "q":
             break
@@ -444,6 +449,10 @@ def main():
             playlist_cleanse()
         elif choice == "3":
             playlist_bulk()
+        elif choice == "4":
+            cleanup_orphaned_songs(dry_run=True)
+            if input("Move these songs to TempDownloads? (y/n): ").strip().lower() == "y":
+                cleanup_orphaned_songs()
         else:
             print("Invalid choice.")
 
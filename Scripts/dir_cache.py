@@ -0,0 +1,133 @@
+import os
+import threading
+
+# watchdog is optional: it uses inotify on Linux and ReadDirectoryChangesW on Windows.
+# Without it every scan() falls back to a single stat() of the folder to compare mtimes.
+try:
+    from watchdog.observers import Observer
+    from watchdog.events import FileSystemEventHandler
+except ImportError:
+    Observer = None
+    FileSystemEventHandler = object
+
+
+class DirSnapshot:
+    """One listing of a folder: {name: (size, mtime_ns)} for files with a tracked suffix."""
+
+    def __init__(self, version: int, mtime: int, entries: dict):
+        self.version = version
+        self.mtime = mtime
+        self.entries = entries
+
+
+class _DirtyHandler(FileSystemEventHandler):
+    def __init__(self, cache):
+        self.cache = cache
+
+    def on_any_event(self, event):
+        self.cache._mark_dirty(os.path.dirname(event.src_path))
+        dest = getattr(event, "dest_path", None)
+        if dest:
+            self.cache._mark_dirty(os.path.dirname(dest))
+
+
+class DirectoryCache:
+    """
+    Cached os.scandir() listings of a few flat folders (AllSongs, TempDownloads, playlists).
+    With a watcher running, a folder is only listed again after the watcher saw an event in it,
+    so repeated scans cost no syscalls at all. Without one, scan() re-lists a folder only when
+    its mtime changed. Only files with a tracked suffix are stat()ed; DirEntry.is_file() reuses
+    the type info the directory listing already returned.
+    """
+
+    def __init__(self, dirs, suffixes, watch: bool = True):
+        self.dirs = [os.path.normpath(str(d)) for d in dirs]
+        self.suffixes = {s.lower() for s in suffixes}
+        self._lock = threading.Lock()
+        self._snapshots: dict[str, DirSnapshot] = {}
+        self._dirty: set[str] = set(self.dirs)
+        self._watched: set[str] = set()
+        self._version = 0
+        self._observer = None
+        if watch and Observer is not None:
+            self._start_watcher()
+
+    def _start_watcher(self):
+        observer = Observer()
+        observer.daemon = True
+        handler = _DirtyHandler(self)
+        for d in self.dirs:
+            if os.path.isdir(d):
+                try:
+                    observer.schedule(handler, d, recursive=False)
+                    self._watched.add(d)
+                except OSError:
+                    pass
+        if self._watched:
+            observer.start()
+            self._observer = observer
+
+    def stop(self):
+        if self._observer is not None:
+            self._observer.stop()
+            self._observer = None
+            self._watched.clear()
+
+    def _mark_dirty(self, d):
+        d = os.path.normpath(d)
+        with self._lock:
+            self._dirty.add(d)
+
+    def is_watched(self, d) -> bool:
+        return os.path.normpath(str(d)) in self._watched
+
+    def invalidate(self, d=None):
+        """Force the next scan of `d` (or every folder) to list it again."""
+        with self._lock:
+            if d is None:
+                self._dirty.update(self.dirs)
+            else:
+                self._dirty.add(os.path.normpath(str(d)))
+
+    def scan(self, d, restat: bool = False) -> DirSnapshot | None:
+        """
+        Current listing of `d`, or None if it doesn't exist. `restat` forces a fresh listing of an
+        unwatched folder (for files edited in place, which don't change the folder mtime).
+        """
+        d = os.path.normpath(str(d))
+        with self._lock:
+            snap = self._snapshots.get(d)
+            if d in self._watched:
+                if snap is not None and d not in self._dirty:
+                    return snap
+            else:
+                try:
+                    mtime = os.stat(d).st_mtime_ns
+                except FileNotFoundError:
+                    self._snapshots.pop(d, None)
+                    return None
+                if snap is not None and not restat and snap.mtime == mtime:
+                    return snap
+            self._dirty.discard(d)
+
+        # list outside the lock so watcher events arriving meanwhile mark it dirty again
+        try:
+            mtime = os.stat(d).st_mtime_ns
+            entries = {}
+            with os.scandir(d) as it:
+                for entry in it:
+                    if os.path.splitext(entry.name)[1].lower() in self.suffixes and entry.is_file():
+                        st = entry.stat()
+                        entries[entry.name] = (st.st_size, st.st_mtime_ns)
+        except FileNotFoundError:
+            with self._lock:
+                self._snapshots.pop(d, None)
+            return None
+
+        with self._lock:
+            if snap is not None and snap.entries == entries and snap.mtime == mtime:
+                return snap
+            self._version += 1
+            snap = DirSnapshot(self._version, mtime, entries)
+            self._snapshots[d] = snap
+            return snap
@@ -0,0 +1,355 @@
+import heapq
+import itertools
+import os
+import queue
+import re
+import threading
+import time
+from concurrent.futures import Future
+from contextlib import contextmanager, nullcontext
+
+import yt_dlp.postprocessor.ffmpeg as ffmpeg_pp
+from yt_dlp.postprocessor import FFmpegExtractAudioPP
+from yt_dlp.utils import DownloadCancelled, Popen
+
+# Stage sizes, overridable from .env
+DOWNLOAD_WORKERS = 10                  # network: bandwidth bound
+TRANSCODE_WORKERS = os.cpu_count() or 2  # ffmpeg: CPU bound
+WRITER_WORKERS = 1                     # moves, playlist writes and tagging stay serialized
+STAGE_QUEUE_SIZE = 4                   # finished items a stage may hold before it waits for the next one
+
+MAX_DOWNLOAD_LIMIT = 50    # highest value the governor may be resized to (the settings spinbox goes to 50)
+ADAPT_WINDOW = 4           # finished downloads (at least `limit` of them) between adaptive adjustments
+ADAPT_TOLERANCE = 0.05     # throughput change smaller than this counts as "no change"
+PASSTHROUGH_CODEC = "best"   # FFmpegExtractAudio: copy the stream when the codec allows it (no re-encode)
+BLOCKED_RE = re.compile(r"HTTP Error (429|403)|Too Many Requests|rate.?limit", re.IGNORECASE)
+
+# Job priorities: lower runs first; jobs of equal priority keep their submit order
+PRIORITY_HIGH = 0      # a download the user just asked for (single download tabs)
+PRIORITY_NORMAL = 1    # batch items, playlist/channel videos, resumed jobs
+
+
+def downloaded_path(info: dict) -> str | None:
+    """Where yt-dlp put the downloaded file, or None if it isn't there."""
+    for d in info.get("requested_downloads") or ():
+        if d.get("filepath") and os.path.exists(d["filepath"]):
+            return d["filepath"]
+    path = info.get("filepath")
+    return path if path and os.path.exists(path) else None
+
+
+def remove_partial_files(temp_dir: str, video_id: str, extra=()) -> list[str]:
+    """
+    Delete what a stopped job left in temp_dir: its "<id>.*" files (.part/.ytdl, the downloaded
+    stream, a half-written conversion) plus the `extra` paths. Returns the names removed.
+    """
+    paths = list(extra)
+    if video_id:
+        try:
+            paths += [os.path.join(temp_dir, name) for name in os.listdir(temp_dir) if name.startswith(f"{video_id}.")]
+        except FileNotFoundError:
+            pass
+    removed = []
+    for path in paths:
+        try:
+            os.remove(path)
+            removed.append(os.path.basename(path))
+        except OSError:
+            pass
+    return removed
+
+
+# ------------------------
+# Cancellation
+# ------------------------
+_bound = threading.local()   # the CancelToken of the job running on this thread, if any
+
+
+class _TrackedPopen(Popen):
+    """yt-dlp's Popen, registered with the job's CancelToken (when one is bound) so cancel() can kill it."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        token = getattr(_bound, "token", None)
+        if token is not None:
+            token._track(self)
+
+
+ffmpeg_pp.Popen = _TrackedPopen   # the ffmpeg postprocessors start their processes through this name
+
+
+class CancelToken:
+    """
+    Cancellation of one job. cancel() works from any thread: the pipeline drops the job before
+    its next stage, progress_hook() aborts a running yt-dlp transfer on its next chunk, and
+    ffmpeg processes started inside bind() are killed.
+    """
+
+    def __init__(self):
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._procs = []
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def cancel(self):
+        with self._lock:
+            self._event.set()
+            procs, self._procs = self._procs, []
+        for proc in procs:
+            if proc.poll() is None:
+                proc.kill()
+
+    def _track(self, proc):
+        with self._lock:
+            if not self.cancelled:
+                self._procs.append(proc)
+                return
+        proc.kill()
+
+    def progress_hook(self, d):
+        """yt-dlp progress hook: stops the download once the job is cancelled."""
+        if self.cancelled:
+            raise DownloadCancelled("Cancelled by the user")
+
+    @contextmanager
+    def bind(self):
+        """Processes started by yt-dlp on this thread inside the block belong to this job."""
+        _bound.token = self
+        try:
+            yield self
+        finally:
+            _bound.token = None
+
+
+def extract_audio(info: dict, codec: str = "mp3", hooks=(), token: CancelToken = None) -> str:
+    """
+    Convert the downloaded file to `codec` with yt-dlp's own FFmpegExtractAudio (same encoder
+    settings as the postprocessor it replaces) and delete the original. Returns the new path.
+    With PASSTHROUGH_CODEC there is no re-encode: webm/opus is remuxed to .opus, and m4a
+    (already an audio file) is kept as it is without running ffmpeg at all.
+    `hooks` are yt-dlp postprocessor hooks (called with status "started" / "finished").
+    Cancelling `token` kills the ffmpeg process.
+    """
+    pp = FFmpegExtractAudioPP(preferredcodec=codec)
+    for hook in hooks:
+        pp.add_progress_hook(hook)
+    with (token or CancelToken()).bind():
+        to_delete, info = pp.run(info)
+    for path in to_delete:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+    return info["filepath"]
+
+
+class Governor:
+    """
+    Resizable limit on how many jobs of a stage run at once. resize() takes effect immediately:
+    raising it wakes waiting workers, lowering it lets running jobs finish and holds new ones back.
+
+    With adaptive=True the limit steers itself every few finished downloads:
+    any HTTP 429/403 halves it, a saturated next stage (transcodes can't keep up) lowers it by one,
+    and otherwise it hill-climbs on measured throughput, one step at a time.
+    """
+
+    def __init__(self, limit: int, ceiling: int = MAX_DOWNLOAD_LIMIT, adaptive: bool = False, on_change=None):
+        self.ceiling = max(1, int(ceiling))
+        self.limit = min(max(1, int(limit)), self.ceiling)
+        self.adaptive = adaptive
+        self.on_change = on_change     # callback(old, new, reason)
+        self.backlog = None            # callable -> True while the next stage's queue is full
+        self.active = 0
+        self._cond = threading.Condition()
+        self._reset_window()
+        self._last_rate = None
+        self._last_step = 0
+
+    def resize(self, limit: int, reason: str = "set"):
+        with self._cond:
+            old = self.limit
+            self.limit = min(max(1, int(limit)), self.ceiling)
+            self._cond.notify_all()
+        if self.limit != old and self.on_change:
+            self.on_change(old, self.limit, reason)
+
+    @contextmanager
+    def slot(self):
+        with self._cond:
+            while self.active >= self.limit:
+                self._cond.wait()
+            self.active += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self.active -= 1
+                self._cond.notify()
+
+    def over_limit(self) -> bool:
+        """More slots taken than the (possibly just lowered) limit allows."""
+        with self._cond:
+            return self.active > self.limit
+
+    # ------------------------
+    # Adaptive mode
+    # ------------------------
+    def _reset_window(self):
+        self._window_start = time.monotonic()
+        self._window_bytes = 0
+        self._window_jobs = 0
+        self._window_blocked = 0
+
+    def record(self, nbytes: int):
+        """A download finished with `nbytes` of data."""
+        with self._cond:
+            self._window_bytes += nbytes
+            self._window_jobs += 1
+        self._maybe_adjust()
+
+    def record_error(self, message: str):
+        """A download failed; 429/403 responses count as the server pushing back."""
+        with self._cond:
+            self._window_jobs += 1
+            if BLOCKED_RE.search(message or ""):
+                self._window_blocked += 1
+        self._maybe_adjust()
+
+    def _maybe_adjust(self):
+        if not self.adaptive:
+            return
+        with self._cond:
+            if self._window_jobs < max(ADAPT_WINDOW, self.limit):
+                return
+            rate = self._window_bytes / max(time.monotonic() - self._window_start, 1e-6)
+            blocked = self._window_blocked
+            self._reset_window()
+
+            limit = self.limit
+            if blocked:
+                new, reason = limit // 2, f"{blocked} blocked request(s)"
+            elif self.backlog is not None and self.backlog():
+                new, reason = limit - 1, "transcoding can't keep up"
+            elif self._last_rate is None or rate > self._last_rate * (1 + ADAPT_TOLERANCE):
+                new, reason = limit + (self._last_step or 1), "throughput went up"
+            elif rate < self._last_rate * (1 - ADAPT_TOLERANCE):
+                new, reason = limit - (self._last_step or 1), "throughput went down"
+            else:
+                new, reason = limit, ""
+            new = min(max(1, new), self.ceiling)
+            self._last_step = (new > limit) - (new < limit)
+            self._last_rate = rate
+        if new != limit:
+            self.resize(new, reason)
+
+
+class Stage:
+    """
+    One step of the pipeline. `func(item)` runs on one of `workers` threads and returns the item
+    for the next stage, or None to stop there (it has already reported why).
+    With a `governor`, the stage gets one thread per possible slot and the governor decides
+    how many of them may run at once.
+    """
+
+    def __init__(self, name: str, func, workers: int = 1, governor: Governor = None):
+        self.name = name
+        self.func = func
+        self.governor = governor
+        self.workers = governor.ceiling if governor else max(1, int(workers))
+
+
+class Pipeline:
+    """
+    Stages connected by bounded queues: a slow transcode never holds a download slot and a busy
+    network never holds a transcode slot. Only the first queue is unbounded (jobs waiting for a
+    download slot); between stages a full queue makes the upstream worker wait (back-pressure).
+    Every queue serves the lowest priority value first, so a PRIORITY_HIGH job overtakes the
+    batch items waiting ahead of it. pause() stops jobs from starting their download (running
+    ones carry on); a job whose CancelToken is cancelled is dropped before its next stage.
+    submit() works from any thread or event loop and returns a concurrent.futures.Future that
+    resolves with the last stage's result (None once a stage stopped or the job was cancelled):
+
+        await asyncio.wrap_future(PIPELINE.submit(ctx))
+    """
+
+    def __init__(self, stages: list[Stage], queue_size: int = STAGE_QUEUE_SIZE):
+        self.stages = stages
+        self._queues = [queue.PriorityQueue()] + [queue.PriorityQueue(maxsize=queue_size) for _ in stages[1:]]
+        self._seq = itertools.count()
+        self._running = threading.Event()
+        self._running.set()
+        for i, stage in enumerate(stages[:-1]):
+            if stage.governor is not None:
+                stage.governor.backlog = self._queues[i + 1].full
+        for i, stage in enumerate(stages):
+            for n in range(stage.workers):
+                threading.Thread(target=self._work, args=(i,), name=f"{stage.name}-{n + 1}", daemon=True).start()
+
+    def submit(self, item, start: str = None, priority: int = PRIORITY_NORMAL, token: CancelToken = None) -> Future:
+        """Queue `item` at the first stage, or at the stage named `start` (skipping those before it)."""
+        i = [stage.name for stage in self.stages].index(start) if start else 0
+        fut = Future()
+        self._queues[i].put((priority, next(self._seq), item, fut, token))
+        return fut
+
+    # ------------------------
+    # Pause / resume
+    # ------------------------
+    @property
+    def paused(self) -> bool:
+        return not self._running.is_set()
+
+    def pause(self):
+        self._running.clear()
+
+    def resume(self):
+        self._running.set()
+
+    def discard_cancelled(self):
+        """Drop the jobs still waiting for the first stage whose token was cancelled (e.g. while paused)."""
+        q = self._queues[0]
+        with q.mutex:
+            dropped = [job for job in q.queue if job[4] is not None and job[4].cancelled]
+            if dropped:
+                q.queue[:] = [job for job in q.queue if job not in dropped]
+                heapq.heapify(q.queue)
+        for job in dropped:
+            job[3].set_result(None)
+
+    def _work(self, i: int):
+        stage = self.stages[i]
+        q = self._queues[i]
+        governor = stage.governor
+        while True:
+            if i == 0:
+                self._running.wait()
+            # with a governor, a job is only taken once there is a slot for it, so waiting jobs
+            # stay in the priority queue instead of sitting in threads blocked on the governor
+            with governor.slot() if governor is not None else nullcontext():
+                job = q.get()
+                if (i == 0 and self.paused) or (governor is not None and governor.over_limit()):
+                    q.put(job)   # paused, or the limit was lowered while this slot waited for a job
+                    continue
+                self._run(i, job)
+
+    def _run(self, i: int, job):
+        stage = self.stages[i]
+        priority, seq, item, fut, token = job
+        if token is not None and token.cancelled:
+            fut.set_result(None)
+            return
+        try:
+            result = stage.func(item)
+        except Exception as e:
+            if token is not None and token.cancelled:
+                fut.set_result(None)
+            else:
+                fut.set_exception(e)
+            return
+        if result is None or i == len(self.stages) - 1:
+            fut.set_result(result)
+        else:
+            self._queues[i + 1].put(job[:2] + (result,) + job[3:])
@@ -0,0 +1,312 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+# Job states, in the order a download goes through them
+PENDING = "pending"           # imported from songs.txt, waiting for a result/playlist choice
+RESOLVING = "resolving"       # the user is picking a search result / playlists for it
+DOWNLOADING = "downloading"
+CONVERTING = "converting"
+TAGGING = "tagging"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"       # stopped by the user
+
+ACTIVE_STATES = (DOWNLOADING, CONVERTING, TAGGING)
+OPEN_STATES = (PENDING, RESOLVING) + ACTIVE_STATES
+
+MAX_ATTEMPTS = 3       # a failed job is retried by later runs until it has failed this often
+RETRY_DELAY = 300      # seconds before the first retry; doubles after every further failure
+LEASE_REFRESH = 5      # seconds between an open queue's heartbeats
+LEASE_TIMEOUT = 20     # a process silent for this long is gone: its active jobs may be resumed
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id        INTEGER PRIMARY KEY AUTOINCREMENT,
+    input     TEXT NOT NULL,
+    url       TEXT,
+    playlists TEXT NOT NULL DEFAULT '[]',
+    state     TEXT NOT NULL,
+    error     TEXT,
+    path      TEXT,
+    created   REAL NOT NULL,
+    updated   REAL NOT NULL,
+    attempts  INTEGER NOT NULL DEFAULT 0,
+    owner     TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_state ON jobs(state);
+CREATE INDEX IF NOT EXISTS jobs_input ON jobs(input);
+CREATE TABLE IF NOT EXISTS owners (
+    owner     TEXT PRIMARY KEY,
+    heartbeat REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS imports (
+    id         INTEGER PRIMARY KEY AUTOINCREMENT,
+    songs_file TEXT NOT NULL,
+    raw        BLOB NOT NULL
+);
+"""
+# columns added after the first release, for databases created before them
+MIGRATIONS = {
+    "attempts": "ALTER TABLE jobs ADD COLUMN attempts INTEGER NOT NULL DEFAULT 0",
+    "owner": "ALTER TABLE jobs ADD COLUMN owner TEXT",
+}
+# a job's owner is gone when it has no heartbeat newer than the cut-off (the ? parameter)
+ORPHANED = "(owner IS NULL OR owner NOT IN (SELECT owner FROM owners WHERE heartbeat > ?))"
+
+
+def songs_lines(raw: bytes) -> list[str]:
+    """Non-empty lines of songs.txt contents (utf-8, falling back to cp1252 like before)."""
+    try:
+        text = raw.decode("utf-8")
+    except UnicodeDecodeError:
+        text = raw.decode("cp1252", errors="replace")
+    return [line.strip() for line in text.splitlines() if line.strip()]
+
+
+def consume_songs_file(songs_file, raw: bytes):
+    """
+    Remove `raw` (what an import read) from the start of songs.txt, keeping lines appended since.
+    If the file was rewritten in the meantime it is left as it is.
+    """
+    try:
+        with open(songs_file, "rb") as f:
+            current = f.read()
+    except FileNotFoundError:
+        return
+    if not current.startswith(raw):
+        return
+    tmp = f"{songs_file}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(current[len(raw):])
+    os.replace(tmp, songs_file)
+
+
+class DownloadQueue:
+    """
+    Persistent download jobs (SQLite, WAL). Every state change is a single-row UPDATE,
+    so finishing a download is O(1) and concurrent workers never rewrite each other's work.
+    songs.txt is only an import source: import_file() moves its lines into the queue once.
+
+    The GUI and the CLI may share the database. Each open queue is an owner (pid + start time)
+    that stamps the jobs it works on and keeps a heartbeat, so recover() only takes over
+    jobs whose owner stopped, never those another running process is downloading.
+    """
+
+    def __init__(self, db_path):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.owner = f"{os.getpid()}-{time.time():.3f}"
+        self._lock = threading.Lock()
+        self._closed = threading.Event()
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+        for column, sql in MIGRATIONS.items():
+            if column not in columns:
+                self._conn.execute(sql)
+        self._beat()
+        threading.Thread(target=self._heartbeat, name="queue-heartbeat", daemon=True).start()
+
+    def close(self):
+        with self._lock:
+            self._closed.set()
+            with self._conn:
+                self._conn.execute("DELETE FROM owners WHERE owner = ?", (self.owner,))
+            self._conn.close()
+
+    def _beat(self):
+        with self._lock:
+            if self._closed.is_set():
+                return
+            with self._conn:
+                self._conn.execute("INSERT OR REPLACE INTO owners (owner, heartbeat) VALUES (?, ?)",
+                                   (self.owner, time.time()))
+
+    def _heartbeat(self):
+        while not self._closed.wait(LEASE_REFRESH):
+            try:
+                self._beat()
+            except sqlite3.Error:
+                pass   # e.g. the database is busy; the next beat is well within LEASE_TIMEOUT
+
+    @staticmethod
+    def _job(row) -> dict | None:
+        if row is None:
+            return None
+        job = dict(row)
+        job["playlists"] = json.loads(job["playlists"])
+        return job
+
+    # ------------------------
+    # Adding jobs
+    # ------------------------
+    def add(self, input_line: str, url=None, playlists=None, state: str = PENDING) -> dict:
+        now = time.time()
+        with self._lock, self._conn:
+            cur = self._conn.execute(
+                "INSERT INTO jobs (input, url, playlists, state, created, updated, owner) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (input_line, url, json.dumps(playlists or []), state, now, now, self.owner),
+            )
+            row = self._conn.execute("SELECT * FROM jobs WHERE id = ?", (cur.lastrowid,)).fetchone()
+        return self._job(row)
+
+    def add_videos(self, urls, playlists=None, state: str = DOWNLOADING) -> list[dict]:
+        """
+        One job per video URL (its own input line) in a single transaction, e.g. the videos of a
+        YouTube playlist. URLs that already have an open job are skipped. Returns the new jobs.
+        """
+        now = time.time()
+        marks = ",".join("?" * len(OPEN_STATES))
+        with self._lock, self._conn:
+            taken = set()
+            for row in self._conn.execute(f"SELECT input, url FROM jobs WHERE state IN ({marks})", OPEN_STATES):
+                taken.update(row)
+            ids = []
+            for url in urls:
+                if url in taken:
+                    continue
+                taken.add(url)
+                cur = self._conn.execute(
+                    "INSERT INTO jobs (input, url, playlists, state, created, updated, owner) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (url, url, json.dumps(playlists or []), state, now, now, self.owner),
+                )
+                ids.append(cur.lastrowid)
+            rows = [self._conn.execute("SELECT * FROM jobs WHERE id = ?", (i,)).fetchone() for i in ids]
+        return [self._job(r) for r in rows]
+
+    def import_file(self, songs_file) -> int:
+        """
+        Move the lines of songs.txt into the queue as pending jobs and remove them from the file.
+        Lines that already have an open job are not queued twice; a line whose job failed is
+        retried right away, and other failed jobs come back once their retry delay has passed
+        (RETRY_DELAY, doubling per failure, up to MAX_ATTEMPTS tries). Returns the number of new jobs.
+        """
+        now = time.time()
+        added = 0
+        with self._lock:
+            self._finish_imports()
+            try:
+                with open(songs_file, "rb") as f:
+                    raw = f.read()
+            except FileNotFoundError:
+                raw = b""
+            lines = songs_lines(raw)
+
+            with self._conn:
+                self._conn.executemany(
+                    "UPDATE jobs SET state = ?, error = NULL, attempts = 0, updated = ? WHERE state = ? AND input = ?",
+                    [(PENDING, now, FAILED, line) for line in set(lines)],
+                )
+                self._conn.execute(
+                    "UPDATE jobs SET state = ?, updated = ? WHERE state = ? AND attempts < ? "
+                    "AND updated <= ? - ? * (1 << max(attempts - 1, 0))",
+                    (PENDING, now, FAILED, MAX_ATTEMPTS, now, RETRY_DELAY),
+                )
+                marks = ",".join("?" * len(OPEN_STATES))
+                open_inputs = {r[0] for r in self._conn.execute(f"SELECT input FROM jobs WHERE state IN ({marks})", OPEN_STATES)}
+                for line in lines:
+                    if line in open_inputs:
+                        continue
+                    open_inputs.add(line)
+                    self._conn.execute(
+                        "INSERT INTO jobs (input, state, created, updated, owner) VALUES (?, ?, ?, ?, ?)",
+                        (line, PENDING, now, now, self.owner),
+                    )
+                    added += 1
+                if raw:
+                    # committed with the jobs: if we crash before songs.txt is trimmed,
+                    # the next import trims these lines instead of queueing them again
+                    self._conn.execute("INSERT INTO imports (songs_file, raw) VALUES (?, ?)", (str(songs_file), raw))
+            self._finish_imports()
+        return added
+
+    def _finish_imports(self):
+        """Trim songs.txt of imports whose jobs are committed (caller holds the lock)."""
+        for row in self._conn.execute("SELECT id, songs_file, raw FROM imports ORDER BY id").fetchall():
+            consume_songs_file(row["songs_file"], row["raw"])
+            with self._conn:
+                self._conn.execute("DELETE FROM imports WHERE id = ?", (row["id"],))
+
+    # ------------------------
+    # State changes
+    # ------------------------
+    def set_state(self, job_id: int, state: str, **fields):
+        """Move a job to `state`, optionally setting url / playlists / error / path. A failure counts as an attempt."""
+        cols = ["state = ?", "updated = ?", "owner = ?"]
+        values = [state, time.time(), self.owner]
+        if state == FAILED:
+            cols.append("attempts = attempts + 1")
+        for key in ("url", "playlists", "error", "path"):
+            if key in fields:
+                cols.append(f"{key} = ?")
+                values.append(json.dumps(fields[key]) if key == "playlists" else fields[key])
+        values.append(job_id)
+        with self._lock, self._conn:
+            self._conn.execute(f"UPDATE jobs SET {', '.join(cols)} WHERE id = ?", values)
+
+    def release(self, job_id: int):
+        """Put a job the user skipped (still resolving) back to pending."""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE jobs SET state = ?, updated = ? WHERE id = ? AND state = ?",
+                (PENDING, time.time(), job_id, RESOLVING),
+            )
+
+    def recover(self) -> list[dict]:
+        """
+        After a crash: jobs of owners that stopped are taken over. Those left resolving go back to
+        pending; those that were downloading or converting are returned to be resumed (yt-dlp
+        continues .part files). A job that was tagging keeps its state and path when the file is
+        still there, so it resumes at the write step instead of downloading again.
+        Jobs of a GUI/CLI that is still running are left alone.
+        """
+        cutoff = time.time() - LEASE_TIMEOUT
+        marks = ",".join("?" * len(ACTIVE_STATES))
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM owners WHERE heartbeat <= ?", (cutoff,))
+            self._conn.execute(f"UPDATE jobs SET state = ? WHERE state = ? AND {ORPHANED}", (PENDING, RESOLVING, cutoff))
+            self._conn.execute(
+                f"UPDATE jobs SET state = ? WHERE state IN ({marks}) AND url IS NULL AND {ORPHANED}",
+                (PENDING, *ACTIVE_STATES, cutoff))
+            rows = self._conn.execute(
+                f"SELECT * FROM jobs WHERE state IN ({marks}) AND {ORPHANED} ORDER BY id", (*ACTIVE_STATES, cutoff)).fetchall()
+            jobs = []
+            for row in rows:
+                job = self._job(row)
+                if not (job["state"] == TAGGING and job["path"] and os.path.exists(job["path"])):
+                    job["state"] = DOWNLOADING
+                job["owner"] = self.owner
+                self._conn.execute("UPDATE jobs SET state = ?, owner = ? WHERE id = ?", (job["state"], self.owner, job["id"]))
+                jobs.append(job)
+        return jobs
+
+    # ------------------------
+    # Queries
+    # ------------------------
+    def get(self, job_id: int) -> dict | None:
+        with self._lock:
+            return self._job(self._conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone())
+
+    def given_up(self) -> list[dict]:
+        """Failed jobs that used up their retries; adding the line to songs.txt again re-queues one."""
+        with self._lock:
+            rows = self._conn.execute("SELECT * FROM jobs WHERE state = ? AND attempts >= ? ORDER BY id",
+                                      (FAILED, MAX_ATTEMPTS)).fetchall()
+        return [self._job(r) for r in rows]
+
+    def jobs(self, *states) -> list[dict]:
+        """Jobs in any of `states` (all jobs if none given), oldest first."""
+        with self._lock:
+            if states:
+                marks = ",".join("?" * len(states))
+                rows = self._conn.execute(f"SELECT * FROM jobs WHERE state IN ({marks}) ORDER BY id", states).fetchall()
+            else:
+                rows = self._conn.execute("SELECT * FROM jobs ORDER BY id").fetchall()
+        return [self._job(r) for r in rows]
@@ -1,4 +1,9 @@
 import os
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from library_catalog import LibraryCatalog, default_data_dir
+from playlist_index import to_rel
 
 # Load .env
 def load_env():
@@ -16,24 +21,145 @@ load_env()
 # folder w all ur .m3u playlists
 PLAYLIST_DIR = os.environ['PLAYLISTS_DIR']
 
-for file in os.listdir(PLAYLIST_DIR):
-    if file.lower().endswith(".m3u"):
-        path = os.path.join(PLAYLIST_DIR, file)
-        with open(path, "r", encoding="utf-8", errors="ignore") as f:
-            lines = [line.strip() for line in f if line.strip() and not line.startswith("#")]
-
-        valid_lines = []
-        for line in lines:
-            song_path = os.path.join(PLAYLIST_DIR, line)
-            if os.path.exists(song_path):
-                valid_lines.append(line)
-            else:
-                print(f"❌ missing: {line} in {file}")
-
-        # write the good lines back
-        with open(path, "w", encoding="utf-8") as f:
-            f.write("#EXTM3U\n")
-            for line in valid_lines:
-                f.write(f"{line}\n")
-
-        print(f"✅ cleaned {file}: kept {len(valid_lines)} of {len(lines)}")
+# where songs normally live, searched when remapping missing entries
+LIBRARY_DIRS = [
+    os.path.join(PLAYLIST_DIR, "AllSongs"),
+    os.path.join(os.path.dirname(os.path.normpath(PLAYLIST_DIR)), "TempDownloads"),
+]
+
+# catalog of AllSongs/TempDownloads, only re-lists folders whose mtime changed
+CATALOG = LibraryCatalog(default_data_dir(PLAYLIST_DIR) / "library.db", PLAYLIST_DIR, [Path(d) for d in LIBRARY_DIRS])
+
+MAX_WORKERS = 8
+
+
+def read_playlist(path):
+    with open(path, "r", encoding="utf-8", errors="ignore") as f:
+        content = f.read()
+    lines = [line.strip() for line in content.splitlines() if line.strip() and not line.startswith("#")]
+    return content, lines
+
+
+def entry_folder(line):
+    """The folder a playlist entry points into, as written."""
+    return os.path.dirname(os.path.normpath(os.path.join(PLAYLIST_DIR, line)))
+
+
+def entry_key(line):
+    """(folder, name) of a playlist entry, normcase'd so Windows lookups stay case-insensitive like os.path.exists."""
+    full = os.path.normpath(os.path.join(PLAYLIST_DIR, line))
+    return os.path.normcase(os.path.dirname(full)), os.path.normcase(os.path.basename(full))
+
+
+def list_dir(folder):
+    """One scandir per folder: the set of file names in it."""
+    try:
+        with os.scandir(folder) as it:
+            return {os.path.normcase(e.name): e.name for e in it if e.is_file()}
+    except (FileNotFoundError, NotADirectoryError, PermissionError):
+        return {}
+
+
+def catalog_listings():
+    """Listings of the catalogued song folders, {normcase'd folder: (real folder, {normcase'd name: name})}."""
+    CATALOG.refresh()
+    listings = {}
+    for d in CATALOG.song_dirs:
+        real = os.path.normpath(str(d))
+        listings[os.path.normcase(real)] = (real, {os.path.normcase(p.name): p.name for p in CATALOG.songs([d])})
+    return listings
+
+
+def write_atomic(path, content):
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(content)
+    os.replace(tmp, path)
+
+
+def check_playlist(lines, existing, catalogued, by_name, remap):
+    """Validate one playlist against the folder listings. Returns (new content, kept, missing, remapped)."""
+    kept, missing, remapped = [], [], []
+    for line in lines:
+        folder, name = entry_key(line)
+        # the catalog only holds audio files, so a miss in a catalogued folder is checked on disk
+        if name in existing.get(folder, ()) or (folder in catalogued and os.path.exists(os.path.join(PLAYLIST_DIR, line))):
+            kept.append(line)
+            continue
+        candidates = by_name.get(name, []) if remap else []
+        if candidates:
+            kept.append(candidates[0])
+            remapped.append((line, candidates[0]))
+        else:
+            missing.append(line)
+    content = "#EXTM3U\n" + "".join(f"{line}\n" for line in kept)
+    return content, kept, missing, remapped
+
+
+def fix_playlists(dry_run=False, remap=False):
+    files = sorted(f for f in os.listdir(PLAYLIST_DIR) if f.lower().endswith(".m3u"))
+    paths = [os.path.join(PLAYLIST_DIR, f) for f in files]
+
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as pool:
+        playlists = list(pool.map(read_playlist, paths))
+
+        # AllSongs/TempDownloads come from the catalog; one scandir per other folder a playlist points into
+        catalog = catalog_listings()
+        folders = {key: real for key, (real, _) in catalog.items()}   # normcase'd key -> real path, for remap targets
+        scan = {}
+        for _, lines in playlists:
+            for line in lines:
+                real = entry_folder(line)
+                if os.path.normcase(real) not in catalog:
+                    scan.setdefault(os.path.normcase(real), real)
+        folders.update(scan)
+        keys = sorted(scan)
+        listings = dict(zip(keys, pool.map(list_dir, [scan[k] for k in keys])))
+        listings.update((key, names) for key, (_, names) in catalog.items())
+
+        existing = {folder: set(names) for folder, names in listings.items()}
+        by_name = {}
+        if remap:
+            for folder, names in listings.items():
+                for key, real_name in names.items():
+                    by_name.setdefault(key, []).append(to_rel(os.path.join(folders[folder], real_name), PLAYLIST_DIR))
+
+        results = list(pool.map(lambda pl: check_playlist(pl[1], existing, catalog, by_name, remap), playlists))
+
+        # only playlists whose entries change (some missing or remapped) get written
+        changed = [
+            (path, content)
+            for path, (_, lines), (content, kept, _, remapped) in zip(paths, playlists, results)
+            if kept != lines or remapped
+        ]
+        if not dry_run:
+            list(pool.map(lambda pc: write_atomic(*pc), changed))
+
+    changed_paths = {path for path, _ in changed}
+    total_missing = total_remapped = 0
+    for file, path, (_, lines), (_, kept, missing, remapped) in zip(files, paths, playlists, results):
+        for line in missing:
+            print(f"❌ missing: {line} in {file}")
+        for old, new in remapped:
+            print(f"🔁 remapped: {old} -> {new} in {file}")
+        total_missing += len(missing)
+        total_remapped += len(remapped)
+        if path not in changed_paths:
+            print(f"✔️ {file}: all {len(lines)} ok, unchanged")
+        elif dry_run:
+            print(f"🔎 {file}: would keep {len(kept)} of {len(lines)} ({len(missing)} missing, {len(remapped)} remapped)")
+        else:
+            print(f"✅ cleaned {file}: kept {len(kept)} of {len(lines)} ({len(missing)} missing, {len(remapped)} remapped)")
+
+    verb = "would rewrite" if dry_run else "rewrote"
+    print(f"\n{len(files)} playlists checked, {verb} {len(changed)}: "
+          f"{total_missing} missing, {total_remapped} remapped")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Drop (or remap) playlist entries whose file no longer exists.")
+    parser.add_argument("--dry-run", action="store_true", help="only report, don't rewrite any playlist")
+    parser.add_argument("--remap", action="store_true",
+                        help="point missing entries at a same-named file found in AllSongs/TempDownloads or another playlist folder")
+    args = parser.parse_args()
+    fix_playlists(dry_run=args.dry_run, remap=args.remap)
@@ -0,0 +1,142 @@
+import threading
+import time
+
+# Job stages as shown to the user, in the order a download goes through them
+QUEUED = "Queued"
+DOWNLOADING = "Downloading"
+CONVERTING = "Converting"
+WRITING = "Writing"
+DONE = "Done"
+FAILED = "Failed"
+CANCELLED = "Cancelled"
+
+KEEP_FINISHED = 5.0   # seconds a finished job stays listed
+
+
+def format_bytes(n) -> str:
+    n = float(n or 0)
+    for unit in ("B", "KiB", "MiB", "GiB"):
+        if n < 1024 or unit == "GiB":
+            return f"{n:.0f} {unit}" if unit == "B" else f"{n:.1f} {unit}"
+        n /= 1024
+
+
+def format_eta(seconds) -> str:
+    if seconds is None:
+        return "--:--"
+    seconds = int(seconds)
+    return f"{seconds // 60}:{seconds % 60:02d}" if seconds < 3600 else f"{seconds // 3600}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}"
+
+
+class ProgressTracker:
+    """
+    Per-job progress (stage, bytes, speed, ETA) fed by yt-dlp's progress and postprocessor hooks
+    and by the pipeline stages. Hooks only store numbers under a lock; a display polls snapshot()
+    at its own pace and redraws only when `version` moved, so 10+ downloads reporting every chunk
+    never turn into 10+ redraws per chunk.
+    """
+
+    def __init__(self, keep_finished: float = KEEP_FINISHED):
+        self.keep_finished = keep_finished
+        self._lock = threading.Lock()
+        self._jobs: dict[int, dict] = {}
+        self.version = 0
+
+    # ------------------------
+    # Updates (any thread)
+    # ------------------------
+    def start(self, job_id: int, label: str):
+        with self._lock:
+            self._jobs[job_id] = {
+                "id": job_id, "label": label, "stage": QUEUED, "downloaded": 0, "total": None,
+                "speed": None, "eta": None, "finished": None,
+            }
+            self.version += 1
+
+    def stage(self, job_id: int, stage: str):
+        self._update(job_id, stage=stage, speed=None, eta=None)
+
+    def finish(self, job_id: int, ok: bool = True, cancelled: bool = False):
+        stage = CANCELLED if cancelled else DONE if ok else FAILED
+        self._update(job_id, stage=stage, speed=None, eta=None, finished=time.monotonic())
+
+    def progress_hook(self, job_id: int):
+        """yt-dlp progress hook for one job."""
+        def hook(d):
+            title = (d.get("info_dict") or {}).get("title")
+            fields = {"label": title} if title else {}
+            if d.get("status") == "downloading":
+                fields.update(
+                    stage=DOWNLOADING,
+                    downloaded=d.get("downloaded_bytes") or 0,
+                    total=d.get("total_bytes") or d.get("total_bytes_estimate"),
+                    speed=d.get("speed"),
+                    eta=d.get("eta"),
+                )
+            elif d.get("status") == "finished":
+                fields.update(downloaded=d.get("total_bytes") or d.get("downloaded_bytes") or 0, speed=None, eta=None)
+                fields["total"] = fields["downloaded"]
+            self._update(job_id, **fields)
+        return hook
+
+    def postprocessor_hook(self, job_id: int):
+        """yt-dlp postprocessor hook for one job (e.g. the audio extraction)."""
+        def hook(d):
+            if d.get("status") == "started":
+                self._update(job_id, stage=CONVERTING)
+        return hook
+
+    def _update(self, job_id: int, **fields):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return
+            job.update(fields)
+            self.version += 1
+
+    # ------------------------
+    # Reading (display thread)
+    # ------------------------
+    def snapshot(self) -> tuple[int, list[dict], dict]:
+        """(version, jobs, totals). Jobs finished more than keep_finished seconds ago are dropped."""
+        now = time.monotonic()
+        with self._lock:
+            for job_id in [j["id"] for j in self._jobs.values()
+                           if j["finished"] is not None and now - j["finished"] > self.keep_finished]:
+                del self._jobs[job_id]
+                self.version += 1
+            jobs = [dict(j) for j in self._jobs.values()]
+            version = self.version
+        active = [j for j in jobs if j["finished"] is None]
+        totals = {
+            "active": len(active),
+            "downloading": sum(1 for j in active if j["stage"] == DOWNLOADING),
+            "speed": sum(j["speed"] or 0 for j in active),
+            "downloaded": sum(j["downloaded"] for j in active),
+            "total": sum(j["total"] or 0 for j in active),
+        }
+        return version, jobs, totals
+
+
+def percent(job: dict) -> int:
+    """Whole-job progress: the download fills most of it, then conversion and writing."""
+    if job["stage"] in (DONE, FAILED, CANCELLED):
+        return 100
+    if job["stage"] == CONVERTING:
+        return 85
+    if job["stage"] == WRITING:
+        return 95
+    if job["total"]:
+        return int(80 * min(job["downloaded"] / job["total"], 1.0))
+    return 0
+
+
+def describe(job: dict) -> str:
+    """One line for a job: title, stage and, while downloading, percent / speed / ETA."""
+    line = f"{job['label']} — {job['stage']}"
+    if job["stage"] == DOWNLOADING:
+        done = f"{format_bytes(job['downloaded'])}"
+        if job["total"]:
+            done += f" / {format_bytes(job['total'])} ({int(100 * job['downloaded'] / job['total'])}%)"
+        line += f" {done}, {format_bytes(job['speed'])}/s, ETA {format_eta(job['eta'])}"
+    return line
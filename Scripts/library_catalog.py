@@ -0,0 +1,401 @@
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+from pathlib import Path
+
+from dir_cache import DirectoryCache
+from playlist_index import parse_entries, to_rel
+
+AUDIO_EXTS = {".mp3", ".flac", ".m4a", ".aac", ".wav", ".ogg", ".opus", ".wma", ".aiff", ".alac"}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS dirs (
+    path  TEXT PRIMARY KEY,
+    mtime INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS songs (
+    path     TEXT PRIMARY KEY,
+    dir      TEXT NOT NULL,
+    rel      TEXT NOT NULL,
+    name     TEXT NOT NULL,
+    size     INTEGER NOT NULL,
+    mtime    INTEGER NOT NULL,
+    title    TEXT,
+    uploader TEXT,
+    video_id TEXT
+);
+CREATE INDEX IF NOT EXISTS songs_dir ON songs(dir);
+CREATE INDEX IF NOT EXISTS songs_rel ON songs(rel);
+CREATE INDEX IF NOT EXISTS songs_video_id ON songs(video_id);
+CREATE INDEX IF NOT EXISTS songs_size ON songs(size);
+CREATE TABLE IF NOT EXISTS hashes (
+    path    TEXT PRIMARY KEY,
+    size    INTEGER NOT NULL,
+    mtime   INTEGER NOT NULL,
+    partial TEXT NOT NULL,
+    full    TEXT
+);
+CREATE TABLE IF NOT EXISTS playlists (
+    name  TEXT PRIMARY KEY,
+    mtime INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS membership (
+    playlist TEXT NOT NULL,
+    pos      INTEGER NOT NULL,
+    rel      TEXT NOT NULL,
+    PRIMARY KEY (playlist, pos)
+);
+CREATE INDEX IF NOT EXISTS membership_rel ON membership(rel);
+"""
+
+VIDEO_ID_RE = re.compile(r"(?:v=|youtu\.be/|/shorts/)([A-Za-z0-9_-]{11})")
+
+PARTIAL_HASH_BYTES = 64 * 1024   # read from the start and from the end of the file
+
+
+def default_data_dir(playlists_dir) -> Path:
+    """DATA_DIR from .env, else a Data folder next to the music folder (like TempDownloads)."""
+    if os.environ.get('DATA_DIR'):
+        return Path(os.environ['DATA_DIR'])
+    return Path(playlists_dir).parent / "Data"
+
+
+def video_id_from_url(url) -> str | None:
+    if not url:
+        return None
+    m = VIDEO_ID_RE.search(url)
+    return m.group(1) if m else None
+
+
+def sha1_file(path: Path, bufsize: int = 1024 * 1024) -> str:
+    h = hashlib.sha1()
+    with path.open("rb") as f:
+        for chunk in iter(lambda: f.read(bufsize), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def partial_hash(path: Path) -> str:
+    """sha1 of the first and last PARTIAL_HASH_BYTES; cheap way to tell same-size files apart."""
+    h = hashlib.sha1()
+    with path.open("rb") as f:
+        h.update(f.read(PARTIAL_HASH_BYTES))
+        size = os.fstat(f.fileno()).st_size
+        if size > 2 * PARTIAL_HASH_BYTES:
+            f.seek(-PARTIAL_HASH_BYTES, os.SEEK_END)
+            h.update(f.read(PARTIAL_HASH_BYTES))
+        elif size > PARTIAL_HASH_BYTES:
+            h.update(f.read())
+    return h.hexdigest()
+
+
+def read_song_meta(path: Path):
+    """Return (title, uploader, video_id) from the file's tags, Nones when unavailable."""
+    try:
+        from mutagen import File as MutagenFile
+        from mutagen.id3 import ID3, ID3NoHeaderError
+    except ImportError:
+        return None, None, None
+
+    try:
+        if path.suffix.lower() == ".mp3":
+            try:
+                tags = ID3(str(path))
+            except ID3NoHeaderError:
+                return None, None, None
+            title = str(tags["TIT2"]) if "TIT2" in tags else None
+            uploader = str(tags["TPE1"]) if "TPE1" in tags else None
+            source = None
+            for frame in tags.getall("WOAS"):
+                source = frame.url
+            for frame in tags.getall("TXXX"):
+                if frame.desc.lower() in ("purl", "source"):
+                    source = str(frame)
+            return title, uploader, video_id_from_url(source)
+
+        audio = MutagenFile(str(path), easy=True)
+        if audio is None or audio.tags is None:
+            return None, None, None
+        title = (audio.tags.get("title") or [None])[0]
+        uploader = (audio.tags.get("artist") or [None])[0]
+        # source URL: "purl" Vorbis comment (opus/ogg) or PURL freeform atom (m4a), see tagging.py
+        if path.suffix.lower() == ".m4a":
+            from mutagen.easymp4 import EasyMP4Tags
+            EasyMP4Tags.RegisterFreeformKey("purl", "PURL")
+        source = (audio.tags.get("purl") or [None])[0]
+        return title, uploader, video_id_from_url(source)
+    except Exception:
+        return None, None, None
+
+
+class LibraryCatalog:
+    """
+    Persistent SQLite catalog of songs, playlists and playlist membership.
+    refresh() is incremental: a song folder is only listed again when its mtime changed
+    (or, with watch=True, when the folder watcher saw an event in it), a song's tags are only
+    read when its size/mtime changed, and a playlist is only parsed when its file mtime changed.
+    """
+
+    def __init__(self, db_path, playlists_dir, song_dirs, watch: bool = False):
+        self.db_path = Path(db_path)
+        self.playlists_dir = Path(playlists_dir)
+        self.song_dirs = [Path(d) for d in song_dirs]
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.dir_cache = DirectoryCache(self.song_dirs + [self.playlists_dir], AUDIO_EXTS | {".m3u"}, watch=watch)
+        self._versions: dict[str, int] = {}   # folder -> DirSnapshot.version last applied
+        self._lock = threading.RLock()
+        self.generation = 0   # bumped whenever the song list may have changed
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self.dir_cache.stop()
+            self._conn.close()
+
+    # ------------------------
+    # Refresh
+    # ------------------------
+    def refresh(self, force: bool = False):
+        """Bring the catalog up to date with the disk. Returns True if anything changed."""
+        with self._lock, self._conn:
+            changed = False
+            for d in self.song_dirs:
+                changed |= self._refresh_dir(d, force)
+            if changed:
+                self.generation += 1
+            changed |= self._refresh_playlists(force)
+            return changed
+
+    def _refresh_dir(self, d: Path, force: bool) -> bool:
+        key = str(d)
+        snap = self.dir_cache.scan(d)
+        row = self._conn.execute("SELECT mtime FROM dirs WHERE path = ?", (key,)).fetchone()
+        if snap is None:
+            self._versions.pop(key, None)
+            self._conn.execute("DELETE FROM songs WHERE dir = ?", (key,))
+            self._conn.execute("DELETE FROM dirs WHERE path = ?", (key,))
+            return row is not None
+        if not force:
+            if self._versions.get(key) == snap.version:
+                return False
+            if key not in self._versions and row and row[0] == snap.mtime:
+                # unchanged since the last run
+                self._versions[key] = snap.version
+                return False
+
+        known = {
+            path: (size, m)
+            for path, size, m in self._conn.execute("SELECT path, size, mtime FROM songs WHERE dir = ?", (key,))
+        }
+        seen = set()
+        changed = False
+        for name, (size, mtime) in snap.entries.items():
+            if os.path.splitext(name)[1].lower() not in AUDIO_EXTS:
+                continue
+            path = os.path.join(key, name)
+            seen.add(path)
+            if known.get(path) == (size, mtime):
+                continue
+            self._upsert_song(Path(path), size, mtime)
+            changed = True
+
+        gone = [(p,) for p in known if p not in seen]
+        self._conn.executemany("DELETE FROM songs WHERE path = ?", gone)
+        self._conn.executemany("DELETE FROM hashes WHERE path = ?", gone)
+        self._conn.execute("INSERT OR REPLACE INTO dirs (path, mtime) VALUES (?, ?)", (key, snap.mtime))
+        self._versions[key] = snap.version
+        return changed or bool(gone)
+
+    def _upsert_song(self, path: Path, size=None, mtime=None):
+        if size is None:
+            st = path.stat()
+            size, mtime = st.st_size, st.st_mtime_ns
+        title, uploader, video_id = read_song_meta(path)
+        self._conn.execute(
+            "INSERT OR REPLACE INTO songs (path, dir, rel, name, size, mtime, title, uploader, video_id) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (str(path), str(path.parent), to_rel(path, self.playlists_dir), path.name,
+             size, mtime, title, uploader, video_id),
+        )
+
+    def _refresh_playlists(self, force: bool) -> bool:
+        key = str(self.playlists_dir)
+        # playlists are edited in place (folder mtime unchanged), so an unwatched folder is re-stat()ed every time
+        snap = self.dir_cache.scan(self.playlists_dir, restat=not self.dir_cache.is_watched(self.playlists_dir))
+        if not force and snap is not None and self._versions.get(key) == snap.version:
+            return False
+        seen = {}
+        if snap is not None:
+            self._versions[key] = snap.version
+            seen = {name[:-4]: mtime for name, (_, mtime) in snap.entries.items() if name.endswith(".m3u")}
+
+        known = dict(self._conn.execute("SELECT name, mtime FROM playlists"))
+        changed = False
+        for name in known:
+            if name not in seen:
+                self._conn.execute("DELETE FROM membership WHERE playlist = ?", (name,))
+                self._conn.execute("DELETE FROM playlists WHERE name = ?", (name,))
+                changed = True
+        for name, mtime in seen.items():
+            if not force and known.get(name) == mtime:
+                continue
+            pl_path = self.playlists_dir / f"{name}.m3u"
+            try:
+                lines = pl_path.read_text(encoding="utf-8", errors="ignore").splitlines()
+            except FileNotFoundError:
+                continue
+            self._store_playlist(name, mtime, parse_entries(lines))
+            changed = True
+        return changed
+
+    def _store_playlist(self, name: str, mtime: int, entries: list[str]):
+        self._conn.execute("DELETE FROM membership WHERE playlist = ?", (name,))
+        self._conn.executemany(
+            "INSERT INTO membership (playlist, pos, rel) VALUES (?, ?, ?)",
+            [(name, i, rel) for i, rel in enumerate(entries)],
+        )
+        self._conn.execute("INSERT OR REPLACE INTO playlists (name, mtime) VALUES (?, ?)", (name, mtime))
+
+    # ------------------------
+    # Updates from our own file operations
+    # ------------------------
+    def song_changed(self, path):
+        """Re-read one song after it was retagged, moved in or created."""
+        path = Path(path)
+        if path.parent not in self.song_dirs:
+            return
+        with self._lock, self._conn:
+            if path.exists():
+                self._upsert_song(path)
+            else:
+                self._conn.execute("DELETE FROM songs WHERE path = ?", (str(path),))
+                self.generation += 1
+
+    def song_moved(self, src, dst):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM songs WHERE path = ?", (str(Path(src)),))
+            if Path(dst).parent in self.song_dirs and Path(dst).exists():
+                self._upsert_song(Path(dst))
+            self.generation += 1
+
+    # ------------------------
+    # Content hashes
+    # ------------------------
+    def find_duplicate(self, src) -> Path | None:
+        """
+        A catalogued song byte-identical to `src`, or None. Candidates are narrowed by size
+        (no reads at all when no song has the same size), then partial hash, then full hash.
+        Hashes of library songs are cached in the db and reused while their size/mtime hold.
+        """
+        src = Path(src)
+        size = src.stat().st_size
+        with self._lock:
+            candidates = self._conn.execute(
+                "SELECT s.path, s.mtime, h.partial, h.full FROM songs s "
+                "LEFT JOIN hashes h ON h.path = s.path AND h.size = s.size AND h.mtime = s.mtime "
+                "WHERE s.size = ? ORDER BY s.path",
+                (size,),
+            ).fetchall()
+        if not candidates:
+            return None
+
+        src_partial = partial_hash(src)
+        src_full = None
+        for path, mtime, partial, full in candidates:
+            path = Path(path)
+            try:
+                if partial is None:
+                    partial = partial_hash(path)
+                    self._store_hash(path, size, mtime, partial, None)
+                if partial != src_partial:
+                    continue
+                if full is None:
+                    full = sha1_file(path)
+                    self._store_hash(path, size, mtime, partial, full)
+            except OSError:
+                continue
+            if src_full is None:
+                src_full = sha1_file(src)
+            if full == src_full:
+                return path
+        return None
+
+    def record_hash(self, path, partial=None, full=None):
+        """Cache the hashes of a song just added to the library (computing the partial one if needed)."""
+        path = Path(path)
+        st = path.stat()
+        self._store_hash(path, st.st_size, st.st_mtime_ns, partial or partial_hash(path), full)
+
+    def _store_hash(self, path: Path, size: int, mtime: int, partial: str, full: str | None):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO hashes (path, size, mtime, partial, full) VALUES (?, ?, ?, ?, ?)",
+                (str(path), size, mtime, partial, full),
+            )
+
+    # ------------------------
+    # Queries
+    # ------------------------
+    def songs(self, dirs=None) -> list[Path]:
+        """Audio files in the song folders (or just `dirs`), sorted by folder then name."""
+        dirs = [str(Path(d)) for d in (dirs or self.song_dirs)]
+        with self._lock:
+            rows = []
+            for d in dirs:
+                rows.extend(self._conn.execute("SELECT path FROM songs WHERE dir = ? ORDER BY name", (d,)))
+        return [Path(r[0]) for r in rows]
+
+    def song_info(self, path) -> dict | None:
+        with self._lock:
+            cur = self._conn.execute("SELECT * FROM songs WHERE path = ?", (str(Path(path)),))
+            row = cur.fetchone()
+            if row is None:
+                return None
+            return dict(zip([c[0] for c in cur.description], row))
+
+    def find_by_video_id(self, video_id: str) -> list[Path]:
+        with self._lock:
+            rows = self._conn.execute("SELECT path FROM songs WHERE video_id = ?", (video_id,)).fetchall()
+        return [Path(r[0]) for r in rows]
+
+    def find_downloaded(self, video_id: str) -> Path | None:
+        """
+        The song downloaded from this YouTube video, going by its source-URL tag, or None.
+        Songs in earlier song folders win (AllSongs before TempDownloads).
+        """
+        order = {d: i for i, d in enumerate(self.song_dirs)}
+        paths = [p for p in self.find_by_video_id(video_id) if p.exists()]
+        return min(paths, key=lambda p: (order.get(p.parent, len(order)), p.name), default=None)
+
+    def song_rels(self) -> set[str]:
+        """Playlist-style entries of every catalogued song."""
+        with self._lock:
+            return {r[0] for r in self._conn.execute("SELECT rel FROM songs")}
+
+    def playlists(self) -> list[str]:
+        with self._lock:
+            return [r[0] for r in self._conn.execute("SELECT name FROM playlists ORDER BY name")]
+
+    def playlist_entries(self, name: str) -> list[str]:
+        with self._lock:
+            return [r[0] for r in self._conn.execute(
+                "SELECT rel FROM membership WHERE playlist = ? ORDER BY pos", (name,))]
+
+    def playlists_for(self, rel: str) -> list[str]:
+        with self._lock:
+            return [r[0] for r in self._conn.execute(
+                "SELECT DISTINCT playlist FROM membership WHERE rel = ? ORDER BY playlist", (rel,))]
+
+    def playlist_snapshot(self) -> dict[str, tuple[int, list[str]]]:
+        """{playlist name: (mtime_ns, entries)} for seeding a PlaylistIndex without re-reading files."""
+        with self._lock:
+            snap = {name: (mtime, []) for name, mtime in self._conn.execute("SELECT name, mtime FROM playlists")}
+            for name, rel in self._conn.execute("SELECT playlist, rel FROM membership ORDER BY playlist, pos"):
+                if name in snap:
+                    snap[name][1].append(rel)
+        return snap
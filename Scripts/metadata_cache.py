@@ -0,0 +1,97 @@
+import json
+import sqlite3
+import threading
+import time
+import zlib
+from pathlib import Path
+
+from yt_dlp import YoutubeDL
+
+from library_catalog import video_id_from_url
+
+SEARCH_TTL = 24 * 3600   # search results barely change within a day
+INFO_TTL = 3600          # full video info holds signed stream URLs, which expire after a few hours
+MAX_ENTRIES = 2000       # least recently used entries beyond this are evicted
+
+# Big parts of a video info dict that nothing here uses
+HEAVY_KEYS = ("automatic_captions", "subtitles", "heatmap", "thumbnails")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key      TEXT PRIMARY KEY,
+    value    BLOB NOT NULL,
+    created  REAL NOT NULL,
+    accessed REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entries_accessed ON entries(accessed);
+"""
+
+
+def search_key(query: str, max_results: int) -> str:
+    return f"search:{max_results}:{' '.join(query.casefold().split())}"
+
+
+def video_key(url: str) -> str:
+    """Same key for every URL form of a YouTube video (watch?v=, youtu.be, shorts)."""
+    video_id = video_id_from_url(url)
+    return f"video:{video_id}" if video_id else f"url:{url.strip()}"
+
+
+def slim_info(info: dict) -> dict:
+    """JSON-safe copy of a yt-dlp info dict without internal and unused heavy fields."""
+    info = YoutubeDL.sanitize_info(info, remove_private_keys=True)
+    for key in HEAVY_KEYS:
+        info.pop(key, None)
+    return info
+
+
+class MetadataCache:
+    """
+    Persistent yt-dlp metadata (search results, video info) in SQLite.
+    Entries expire after the TTL the caller asks for and the table is kept to `max_entries`
+    by evicting the least recently used rows. Values are zlib-compressed JSON.
+    """
+
+    def __init__(self, db_path, max_entries: int = MAX_ENTRIES):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        with self._conn:
+            self._conn.execute("DELETE FROM entries WHERE created < ?", (time.time() - max(SEARCH_TTL, INFO_TTL),))
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def get(self, key: str, ttl: float):
+        """Cached value for `key`, or None if missing or older than `ttl` seconds."""
+        now = time.time()
+        with self._lock, self._conn:
+            row = self._conn.execute("SELECT value, created FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            if now - row[1] > ttl:
+                self._conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+                return None
+            self._conn.execute("UPDATE entries SET accessed = ? WHERE key = ?", (now, key))
+        return json.loads(zlib.decompress(row[0]))
+
+    def put(self, key: str, value):
+        now = time.time()
+        blob = zlib.compress(json.dumps(value).encode("utf-8"))
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO entries (key, value, created, accessed) VALUES (?, ?, ?, ?)",
+                (key, blob, now, now),
+            )
+            (count,) = self._conn.execute("SELECT COUNT(*) FROM entries").fetchone()
+            if count > self.max_entries:
+                self._conn.execute(
+                    "DELETE FROM entries WHERE key IN (SELECT key FROM entries ORDER BY accessed LIMIT ?)",
+                    (count - self.max_entries,),
+                )
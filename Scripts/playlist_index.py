@@ -0,0 +1,235 @@
+import os
+import threading
+import time
+from pathlib import Path
+
+# Seconds a lookup may reuse the last directory scan before re-checking mtimes.
+REFRESH_INTERVAL = 1.0
+
+
+def to_rel(song_path, playlists_dir) -> str:
+    """Playlist-style entry for a song: relative to the playlists dir, forward slashes."""
+    return os.path.relpath(song_path, playlists_dir).replace("\\", "/")
+
+
+def parse_entries(lines) -> list[str]:
+    """Song entries of an .m3u (no blanks, no #EXTM3U / #EXTINF lines)."""
+    return [ln.strip() for ln in lines if ln.strip() and not ln.startswith("#")]
+
+
+class PlaylistIndex:
+    """
+    In-memory reverse index: song entry (relative path) -> set of playlist names.
+    Playlists are only re-read when their file mtime changes, and every function that
+    writes a playlist reports the new contents through write()/record() so lookups
+    never have to touch the disk.
+    """
+
+    def __init__(self, playlists_dir):
+        self.playlists_dir = Path(playlists_dir)
+        self._lock = threading.RLock()
+        self._mtimes: dict[str, int] = {}          # playlist name -> st_mtime_ns
+        self._entries: dict[str, list[str]] = {}   # playlist name -> ordered entries
+        self._members: dict[str, set[str]] = {}    # song entry -> playlist names
+        self._last_refresh = 0.0
+
+    # ------------------------
+    # Loading
+    # ------------------------
+    def refresh(self, force: bool = False):
+        """Reload playlists whose mtime changed and drop ones that were deleted."""
+        with self._lock:
+            now = time.monotonic()
+            if not force and now - self._last_refresh < REFRESH_INTERVAL:
+                return
+            self._last_refresh = now
+
+            seen = {}
+            try:
+                with os.scandir(self.playlists_dir) as it:
+                    for entry in it:
+                        if entry.name.endswith(".m3u") and entry.is_file():
+                            seen[entry.name[:-4]] = entry.stat().st_mtime_ns
+            except FileNotFoundError:
+                pass
+
+            for name in list(self._mtimes):
+                if name not in seen:
+                    self._set(name, [])
+                    del self._mtimes[name]
+                    del self._entries[name]
+
+            for name, mtime in seen.items():
+                if self._mtimes.get(name) != mtime:
+                    pl_path = self.playlists_dir / f"{name}.m3u"
+                    try:
+                        lines = pl_path.read_text(encoding="utf-8", errors="ignore").splitlines()
+                    except FileNotFoundError:
+                        continue
+                    self._set(name, parse_entries(lines))
+                    self._mtimes[name] = mtime
+
+    def seed(self, snapshot: dict):
+        """Preload {name: (mtime_ns, entries)}, e.g. from the library catalog, so refresh() skips unchanged files."""
+        with self._lock:
+            for name, (mtime, entries) in snapshot.items():
+                self._set(name, entries)
+                self._mtimes[name] = mtime
+
+    def _set(self, name: str, entries: list[str]):
+        old = set(self._entries.get(name, ()))
+        new = set(entries)
+        for rel in old - new:
+            pls = self._members.get(rel)
+            if pls:
+                pls.discard(name)
+                if not pls:
+                    del self._members[rel]
+        for rel in new - old:
+            self._members.setdefault(rel, set()).add(name)
+        self._entries[name] = list(entries)
+
+    # ------------------------
+    # Keeping in sync with our own writes
+    # ------------------------
+    def record(self, pl_path, lines):
+        """Tell the index the playlist now contains `lines` (call after writing it)."""
+        pl_path = Path(pl_path)
+        with self._lock:
+            self._set(pl_path.stem, parse_entries(lines))
+            try:
+                self._mtimes[pl_path.stem] = pl_path.stat().st_mtime_ns
+            except FileNotFoundError:
+                self._mtimes.pop(pl_path.stem, None)
+
+    def write(self, pl_path, lines):
+        """Write the playlist lines to disk and update the index."""
+        pl_path = Path(pl_path)
+        with self._lock:
+            pl_path.write_text("\n".join(lines), encoding="utf-8")
+            self.record(pl_path, lines)
+
+    def forget(self, pl_path):
+        """Drop a playlist that was deleted or renamed."""
+        name = Path(pl_path).stem
+        with self._lock:
+            self._set(name, [])
+            self._entries.pop(name, None)
+            self._mtimes.pop(name, None)
+
+    # ------------------------
+    # Lookups
+    # ------------------------
+    def playlists_for(self, rel: str) -> list[str]:
+        """Names of the playlists containing the entry, sorted."""
+        with self._lock:
+            self.refresh()
+            return sorted(self._members.get(rel, ()))
+
+    def entries(self, name: str) -> list[str]:
+        """Entries of one playlist in file order."""
+        with self._lock:
+            self.refresh()
+            return list(self._entries.get(name, ()))
+
+    def all_entries(self) -> set[str]:
+        """Every entry referenced by at least one playlist."""
+        with self._lock:
+            self.refresh()
+            return set(self._members)
+
+    def contains(self, name: str, rel: str) -> bool:
+        with self._lock:
+            self.refresh()
+            return name in self._members.get(rel, ())
+
+
+class PlaylistTransaction:
+    """
+    Batch of playlist edits. Each playlist is read at most once (only if an edit can touch it),
+    all adds/removes are applied in memory, and commit() writes every changed playlist exactly once.
+
+        with PlaylistTransaction(PLAYLIST_INDEX) as txn:
+            txn.remove(pl_path, rel)
+            txn.add(other_pl, rel)
+            names = txn.playlists_for(rel)   # membership after the edits
+    """
+
+    def __init__(self, index: PlaylistIndex):
+        self.index = index
+        self._loaded: dict[Path, list[str]] = {}     # playlist -> original lines
+        self._present: dict[Path, set[str]] = {}     # playlist -> entries after edits
+        self._dropped: dict[Path, set[str]] = {}
+        self._appended: dict[Path, list[str]] = {}
+        self.index.refresh(force=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.commit()
+
+    def _load(self, pl_path: Path):
+        if pl_path not in self._loaded:
+            lines = pl_path.read_text(encoding="utf-8", errors="ignore").splitlines() if pl_path.exists() else []
+            self._loaded[pl_path] = lines
+            self._present[pl_path] = set(parse_entries(lines))
+            self._dropped[pl_path] = set()
+            self._appended[pl_path] = []
+
+    def add(self, pl_path, rel: str) -> bool:
+        """Add the entry; True if it was not in the playlist yet."""
+        pl_path = Path(pl_path)
+        self._load(pl_path)
+        if rel in self._present[pl_path]:
+            return False
+        self._present[pl_path].add(rel)
+        if rel in self._dropped[pl_path]:
+            self._dropped[pl_path].discard(rel)   # removed then re-added: keep its old position
+        else:
+            self._appended[pl_path].append(rel)
+        return True
+
+    def remove(self, pl_path, rel: str) -> bool:
+        """Remove the entry; True if it was in the playlist."""
+        pl_path = Path(pl_path)
+        if pl_path not in self._loaded and not self.index.contains(pl_path.stem, rel):
+            return False
+        self._load(pl_path)
+        if rel not in self._present[pl_path]:
+            return False
+        self._present[pl_path].discard(rel)
+        if rel in self._appended[pl_path]:
+            self._appended[pl_path].remove(rel)
+        else:
+            self._dropped[pl_path].add(rel)
+        return True
+
+    def playlists_for(self, rel: str) -> list[str]:
+        """Playlist names containing the entry, including uncommitted edits."""
+        names = {pl.stem for pl, present in self._present.items() if rel in present}
+        loaded = {pl.stem for pl in self._loaded}
+        names.update(n for n in self.index.playlists_for(rel) if n not in loaded)
+        return sorted(names)
+
+    def commit(self) -> list[Path]:
+        """Write each playlist whose contents changed, once. Returns the written playlists."""
+        written = []
+        for pl_path, lines in self._loaded.items():
+            dropped = self._dropped[pl_path]
+            appended = self._appended[pl_path]
+            if not dropped and not appended:
+                continue
+            new_lines = [ln for ln in lines if ln.strip() and ln.strip() not in dropped]
+            if appended and (not new_lines or new_lines[0].strip() != "#EXTM3U"):
+                new_lines.insert(0, "#EXTM3U")
+            new_lines.extend(appended)
+            if new_lines != lines:
+                self.index.write(pl_path, new_lines)
+                written.append(pl_path)
+        self._loaded.clear()
+        self._present.clear()
+        self._dropped.clear()
+        self._appended.clear()
+        return written
@@ -0,0 +1,156 @@
+import re
+import threading
+import unicodedata
+from collections import OrderedDict
+from pathlib import Path
+
+# "(Official Video)", "[Lyrics]", "(HD Remastered)" etc. are noise for searching
+NOISE_RE = re.compile(
+    r"[\(\[][^\)\]]*\b(official|video|audio|lyrics?|visuali[sz]er|hd|hq|4k|remaster(ed)?|explicit|mv|m/v)\b[^\)\]]*[\)\]]",
+    re.IGNORECASE,
+)
+NON_WORD_RE = re.compile(r"[\W_]+")
+
+FUZZY_LIMIT = 15     # same as the old difflib n=15
+FUZZY_CUTOFF = 0.3   # same as the old difflib cutoff
+CACHE_SIZE = 256
+
+
+def normalize(name: str) -> str:
+    """Accent-fold, case-fold, drop bracketed noise and punctuation."""
+    name = NOISE_RE.sub(" ", name)
+    name = unicodedata.normalize("NFKD", name)
+    name = "".join(ch for ch in name if not unicodedata.combining(ch))
+    name = name.casefold()
+    return NON_WORD_RE.sub(" ", name).strip()
+
+
+def trigrams(text: str) -> set[str]:
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class SongSearchIndex:
+    """
+    Trigram inverted index over normalized song names.
+    Candidates come from the posting lists of the query's trigrams and are ranked by
+    Dice similarity of the trigram sets; substring hits are always returned first.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._postings: dict[str, set[Path]] = {}
+        self._norm: dict[Path, str] = {}
+        self._grams: dict[Path, set[str]] = {}
+        self._cache: OrderedDict[str, list[Path]] = OrderedDict()
+        self.generation = None   # catalog generation this index was last synced to
+
+    # ------------------------
+    # Maintenance
+    # ------------------------
+    def add(self, path: Path):
+        with self._lock:
+            if path in self._norm:
+                return
+            norm = normalize(path.stem)
+            grams = trigrams(norm)
+            self._norm[path] = norm
+            self._grams[path] = grams
+            for g in grams:
+                self._postings.setdefault(g, set()).add(path)
+            self._cache.clear()
+
+    def remove(self, path: Path):
+        with self._lock:
+            grams = self._grams.pop(path, None)
+            if grams is None:
+                return
+            del self._norm[path]
+            for g in grams:
+                posting = self._postings.get(g)
+                if posting:
+                    posting.discard(path)
+                    if not posting:
+                        del self._postings[g]
+            self._cache.clear()
+
+    def move(self, src: Path, dst: Path):
+        with self._lock:
+            self.remove(src)
+            self.add(dst)
+
+    def sync(self, paths, generation=None):
+        """Make the index hold exactly `paths`, touching only what was added or removed."""
+        with self._lock:
+            paths = set(paths)
+            current = set(self._norm)
+            for p in current - paths:
+                self.remove(p)
+            for p in paths - current:
+                self.add(p)
+            self.generation = generation
+
+    # ------------------------
+    # Search
+    # ------------------------
+    def search(self, term: str, limit: int = FUZZY_LIMIT, cutoff: float = FUZZY_CUTOFF) -> list[Path]:
+        with self._lock:
+            if term in self._cache:
+                self._cache.move_to_end(term)
+                return list(self._cache[term])
+
+            results = self._search(term, limit, cutoff)
+
+            self._cache[term] = results
+            if len(self._cache) > CACHE_SIZE:
+                self._cache.popitem(last=False)
+            return list(results)
+
+    def search_within(self, term: str, paths, limit: int = FUZZY_LIMIT, cutoff: float = FUZZY_CUTOFF) -> list[Path]:
+        """Rank only `paths` (e.g. the previous results when a query was refined) instead of the whole library."""
+        q = normalize(term)
+        if not q:
+            return []
+        with self._lock:
+            q_grams = trigrams(q)
+            substring, fuzzy = [], []
+            for p in paths:
+                grams = self._grams.get(p)
+                if grams is None:
+                    continue
+                score = 2 * len(q_grams & grams) / (len(q_grams) + len(grams))
+                if q in self._norm[p]:
+                    substring.append((score, p))
+                elif len(q) >= 3 and score >= cutoff:
+                    fuzzy.append((score, p))
+        substring.sort(key=lambda sp: (-sp[0], sp[1].name.lower()))
+        fuzzy.sort(key=lambda sp: (-sp[0], sp[1].name.lower()))
+        return [p for _, p in substring] + [p for _, p in fuzzy[:limit]]
+
+    def _search(self, term: str, limit: int, cutoff: float) -> list[Path]:
+        q = normalize(term)
+        if not q:
+            return []
+
+        if len(q) < 3:
+            # too short for trigram candidates; a plain scan is cheap at this length
+            hits = [p for p, norm in self._norm.items() if q in norm]
+            return sorted(hits, key=lambda p: (len(self._norm[p]), p.name.lower()))
+
+        q_grams = trigrams(q)
+        shared: dict[Path, int] = {}
+        for g in q_grams:
+            for p in self._postings.get(g, ()):
+                shared[p] = shared.get(p, 0) + 1
+
+        substring, fuzzy = [], []
+        for p, n in shared.items():
+            score = 2 * n / (len(q_grams) + len(self._grams[p]))
+            if q in self._norm[p]:
+                substring.append((score, p))
+            elif score >= cutoff:
+                fuzzy.append((score, p))
+
+        substring.sort(key=lambda sp: (-sp[0], sp[1].name.lower()))
+        fuzzy.sort(key=lambda sp: (-sp[0], sp[1].name.lower()))
+        return [p for _, p in substring] + [p for _, p in fuzzy[:limit]]
@@ -0,0 +1,144 @@
+import base64
+import os
+
+from mutagen import File as MutagenFile
+from mutagen.flac import Picture
+from mutagen.id3 import ID3, COMM, APIC, TIT2, TPE1, WOAS, ID3NoHeaderError
+from mutagen.mp4 import MP4, MP4Cover, MP4FreeForm
+
+# Free space left in the tag after a write, so later comment (playlist) updates fit in place
+# instead of rewriting the whole file to grow the tag.
+PADDING = 4096
+MAX_PADDING = 64 * 1024   # more than this left over (e.g. a cover got smaller) is trimmed on the next write
+
+# Formats whose tags hold the playlist comment: ID3 (mp3), Vorbis comments (opus/ogg), MP4 atoms (m4a)
+TAGGABLE_EXTS = {".mp3", ".opus", ".ogg", ".m4a"}
+
+MP4_SOURCE_KEY = "----:com.apple.iTunes:PURL"   # read back by library_catalog as the "purl" key
+MP4_COVER_FORMATS = {"image/jpeg": MP4Cover.FORMAT_JPEG, "image/png": MP4Cover.FORMAT_PNG}
+
+# What makes two ID3 frames of a kind equal, for the "nothing changed" check
+_FRAME_FIELDS = {
+    "COMM": lambda f: list(f.text),
+    "TIT2": lambda f: list(f.text),
+    "TPE1": lambda f: list(f.text),
+    "WOAS": lambda f: f.url,
+    "APIC": lambda f: (f.mime, f.data),
+}
+
+
+def is_taggable(path) -> bool:
+    return os.path.splitext(str(path))[1].lower() in TAGGABLE_EXTS
+
+
+def _padding(info) -> int:
+    """Keep the current padding when the new tag fits in it, so the audio data is not moved."""
+    if 0 <= info.padding <= MAX_PADDING:
+        return info.padding
+    return PADDING
+
+
+def song_frames(playlists=None, cover=None, mime=None, artist=None, title=None, source_url=None) -> list:
+    """ID3 frames for the given values; None means "leave that frame as it is"."""
+    frames = []
+    if playlists is not None:
+        frames.append(COMM(encoding=3, lang="eng", desc="", text=", ".join(playlists)))
+    if cover:
+        frames.append(APIC(encoding=3, mime=mime or 'image/jpeg', type=3, desc='Cover', data=cover))
+    if artist:
+        frames.append(TPE1(encoding=3, text=artist))
+    if title:
+        frames.append(TIT2(encoding=3, text=title))
+    if source_url:
+        frames.append(WOAS(url=source_url))
+    return frames
+
+
+def _vorbis_values(playlists, cover, mime, artist, title, source_url) -> dict:
+    values = {}
+    if playlists is not None:
+        values["comment"] = [", ".join(playlists)]
+    if cover:
+        pic = Picture()
+        pic.type, pic.mime, pic.desc, pic.data = 3, mime or "image/jpeg", "Cover", cover
+        values["metadata_block_picture"] = [base64.b64encode(pic.write()).decode("ascii")]
+    if artist:
+        values["artist"] = [artist]
+    if title:
+        values["title"] = [title]
+    if source_url:
+        values["purl"] = [source_url]
+    return values
+
+
+def _mp4_values(playlists, cover, mime, artist, title, source_url) -> dict:
+    values = {}
+    if playlists is not None:
+        values["\xa9cmt"] = [", ".join(playlists)]
+    if cover and (mime or "image/jpeg") in MP4_COVER_FORMATS:   # MP4 covers can only be JPEG or PNG
+        values["covr"] = [MP4Cover(cover, MP4_COVER_FORMATS[mime or "image/jpeg"])]
+    if artist:
+        values["\xa9ART"] = [artist]
+    if title:
+        values["\xa9nam"] = [title]
+    if source_url:
+        values[MP4_SOURCE_KEY] = [MP4FreeForm(source_url.encode("utf-8"))]
+    return values
+
+
+def _write_id3(song_path, values) -> bool:
+    try:
+        tags = ID3(song_path)
+    except ID3NoHeaderError:
+        tags = ID3()  # create new ID3 tag block if missing
+
+    changed = False
+    for frame in song_frames(*values):
+        same = _FRAME_FIELDS[frame.FrameID]
+        existing = tags.getall(frame.FrameID)
+        if len(existing) == 1 and same(existing[0]) == same(frame):
+            continue
+        tags.delall(frame.FrameID)
+        tags.add(frame)
+        changed = True
+
+    if changed:
+        # ID3v2.3 is the most compatible with Explorer/Foobar
+        tags.save(song_path, v2_version=3, padding=_padding)
+    return changed
+
+
+def _write_keyed(audio, wanted: dict) -> bool:
+    """Vorbis comments / MP4 atoms: set the keys that differ and save once."""
+    if audio.tags is None:
+        audio.add_tags()
+    changed = False
+    for key, value in wanted.items():
+        if audio.tags.get(key) == value:
+            continue
+        audio.tags[key] = value
+        changed = True
+    if changed:
+        audio.save(padding=_padding)
+    return changed
+
+
+def write_song_tags(song_path: str, playlists=None, cover=None, mime=None, artist=None, title=None, source_url=None) -> bool:
+    """
+    Put playlists (comment), cover, artist, title and source URL into the song with a single save,
+    reserving padding for later comment updates. Handles mp3 (ID3), opus/ogg (Vorbis comments)
+    and m4a (MP4 atoms). Returns False without touching the file when the tags already hold
+    these values, or when the format has no tags we write.
+    """
+    values = (playlists, cover, mime, artist, title, source_url)
+    ext = os.path.splitext(song_path)[1].lower()
+    if ext == ".mp3":
+        return _write_id3(song_path, values)
+    if ext == ".m4a":
+        return _write_keyed(MP4(song_path), _mp4_values(*values))
+    if ext in (".opus", ".ogg"):
+        audio = MutagenFile(song_path)   # Ogg Opus or Ogg Vorbis
+        if audio is None:
+            return False
+        return _write_keyed(audio, _vorbis_values(*values))
+    return False
@@ -0,0 +1,146 @@
+import hashlib
+import http.client
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from urllib.parse import urljoin, urlsplit
+
+FETCH_WORKERS = 4
+MAX_IDLE_PER_HOST = 4
+MAX_CACHED = 2000        # thumbnail files kept on disk; the oldest are removed beyond this
+TIMEOUT = 20
+USER_AGENT = "Mozilla/5.0"
+
+EXT_BY_MIME = {"image/jpeg": ".jpg", "image/png": ".png", "image/webp": ".webp"}
+MIME_BY_EXT = {ext: mime for mime, ext in EXT_BY_MIME.items()}
+
+
+class ThumbnailFetcher:
+    """
+    Cover art downloads over pooled keep-alive connections (one idle list per host), with the
+    images cached on disk by URL so a re-download never fetches the same thumbnail twice.
+    prefetch() starts a fetch in the background, e.g. as soon as yt-dlp knows the video's info,
+    so it overlaps with the audio download.
+    """
+
+    def __init__(self, cache_dir, workers: int = FETCH_WORKERS):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._idle: dict[tuple[str, str], list[http.client.HTTPConnection]] = {}
+        self._inflight = {}   # url -> Future, so concurrent requests for one URL share a fetch
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="thumbnail")
+
+    # ------------------------
+    # Public
+    # ------------------------
+    def prefetch(self, url: str):
+        """Future of (data, mime) for `url`."""
+        with self._lock:
+            fut = self._inflight.get(url)
+            if fut is None:
+                fut = self._pool.submit(self.fetch, url)
+                self._inflight[url] = fut
+                fut.add_done_callback(lambda _: self._forget(url))
+            return fut
+
+    def fetch(self, url: str) -> tuple[bytes, str]:
+        """(data, mime) of the image, from the disk cache when possible."""
+        cached = self._cached(url)
+        if cached is not None:
+            return cached
+        data, mime = self._get(url)
+        self._store(url, data, mime)
+        return data, mime
+
+    # ------------------------
+    # Disk cache
+    # ------------------------
+    def _key(self, url: str) -> str:
+        return hashlib.sha1(url.encode("utf-8")).hexdigest()
+
+    def _cached(self, url: str):
+        key = self._key(url)
+        for ext, mime in MIME_BY_EXT.items():
+            path = self.cache_dir / f"{key}{ext}"
+            try:
+                return path.read_bytes(), mime
+            except FileNotFoundError:
+                continue
+        return None
+
+    def _store(self, url: str, data: bytes, mime: str):
+        ext = EXT_BY_MIME.get(mime.split(";")[0].strip().lower())
+        if ext is None:
+            return
+        path = self.cache_dir / f"{self._key(url)}{ext}"
+        tmp = path.with_suffix(ext + ".tmp")
+        tmp.write_bytes(data)
+        os.replace(tmp, path)
+        self._evict()
+
+    def _evict(self):
+        with os.scandir(self.cache_dir) as it:
+            files = [e for e in it if e.is_file() and not e.name.endswith(".tmp")]
+        if len(files) <= MAX_CACHED:
+            return
+        files.sort(key=lambda e: e.stat().st_mtime)
+        for e in files[:len(files) - MAX_CACHED]:
+            try:
+                os.remove(e.path)
+            except FileNotFoundError:
+                pass
+
+    def _forget(self, url: str):
+        with self._lock:
+            self._inflight.pop(url, None)
+
+    # ------------------------
+    # Keep-alive HTTP
+    # ------------------------
+    def _checkout(self, key):
+        with self._lock:
+            idle = self._idle.get(key)
+            if idle:
+                return idle.pop(), True
+        scheme, host = key
+        cls = http.client.HTTPSConnection if scheme == "https" else http.client.HTTPConnection
+        return cls(host, timeout=TIMEOUT), False
+
+    def _checkin(self, key, conn):
+        with self._lock:
+            idle = self._idle.setdefault(key, [])
+            if len(idle) < MAX_IDLE_PER_HOST:
+                idle.append(conn)
+                return
+        conn.close()
+
+    def _get(self, url: str, redirects: int = 3) -> tuple[bytes, str]:
+        parts = urlsplit(url)
+        key = (parts.scheme or "https", parts.netloc)
+        path = (parts.path or "/") + (f"?{parts.query}" if parts.query else "")
+
+        while True:
+            conn, reused = self._checkout(key)
+            try:
+                conn.request("GET", path, headers={"User-Agent": USER_AGENT})
+                resp = conn.getresponse()
+                data = resp.read()
+                break
+            except (http.client.HTTPException, OSError):
+                conn.close()
+                if not reused:
+                    raise
+                # the server dropped an idle keep-alive connection; retry on a fresh one
+
+        if resp.will_close:
+            conn.close()
+        else:
+            self._checkin(key, conn)
+
+        if resp.status in (301, 302, 303, 307, 308) and redirects > 0 and resp.getheader("Location"):
+            return self._get(urljoin(url, resp.getheader("Location")), redirects - 1)
+        if resp.status != 200:
+            raise OSError(f"HTTP {resp.status} for {url}")
+        return data, resp.getheader("Content-Type", "image/jpeg")
@@ -0,0 +1,67 @@
+import re
+from urllib.parse import parse_qs, urlsplit
+
+from library_catalog import video_id_from_url
+from ytdl_pool import YDL_POOL, FLAT_OPTS
+
+# Channel pages; the tab (if any) is group 2. Without a tab, or on the home tab, the Videos tab is listed.
+CHANNEL_PATH_RE = re.compile(r"^/(@[^/]+|channel/[^/]+|c/[^/]+|user/[^/]+)(?:/(videos|shorts|streams|featured))?/?$")
+UNAVAILABLE_TITLES = {"[Private video]", "[Deleted video]"}
+
+
+def is_collection_url(url: str) -> bool:
+    """A YouTube playlist or channel link. A watch link that also carries &list= is a single video."""
+    parts = urlsplit(url.strip())
+    host = parts.netloc.lower()
+    if not host.endswith("youtube.com"):
+        return False
+    if "v" in parse_qs(parts.query) or parts.path.startswith("/shorts/"):
+        return False
+    return "list" in parse_qs(parts.query) or bool(CHANNEL_PATH_RE.match(parts.path))
+
+
+def _listing_url(url: str) -> str:
+    parts = urlsplit(url.strip())
+    m = CHANNEL_PATH_RE.match(parts.path)
+    if m and m.group(2) in (None, "featured"):
+        return f"{parts.scheme or 'https'}://{parts.netloc}/{m.group(1)}/videos"
+    return url.strip()
+
+
+def expand_collection(url: str) -> tuple[str, list[dict]]:
+    """
+    (title, videos) of a playlist or channel from a single flat extraction: the list is read
+    without resolving each video. Videos are {"id", "url", "title", "uploader"} dicts in list
+    order, without repeats and without private/deleted entries.
+    """
+    with YDL_POOL.checkout(FLAT_OPTS) as ydl:
+        info = ydl.extract_info(_listing_url(url), download=False)
+
+    videos, seen = [], set()
+    for e in info.get("entries") or ():
+        if not e or e.get("title") in UNAVAILABLE_TITLES:
+            continue
+        video_id = video_id_from_url(e.get("url")) or (e.get("id") if e.get("ie_key") == "Youtube" else None)
+        if not video_id or video_id in seen:
+            continue   # e.g. a nested playlist on a channel's Playlists tab
+        seen.add(video_id)
+        videos.append({
+            "id": video_id,
+            "url": f"https://www.youtube.com/watch?v={video_id}",
+            "title": e.get("title") or video_id,
+            "uploader": e.get("uploader") or e.get("channel") or info.get("uploader") or "Unknown",
+        })
+    return info.get("title") or url, videos
+
+
+def queue_videos(queue, catalog, videos: list[dict], playlists: list[str]) -> tuple[list[dict], int]:
+    """
+    Jobs (already downloading, all with `playlists`) for the videos of an expanded list.
+    Videos already in the library are skipped unless there are playlists to add them to, which
+    the downloaded-video archive then does without downloading; videos with an open job are skipped.
+    Returns (new jobs, number skipped).
+    """
+    catalog.refresh()
+    urls = [v["url"] for v in videos if playlists or not catalog.find_downloaded(v["id"])]
+    jobs = queue.add_videos(urls, playlists)
+    return jobs, len(videos) - len(jobs)
@@ -0,0 +1,111 @@
+import atexit
+import os
+import threading
+from contextlib import contextmanager
+
+from yt_dlp import YoutubeDL
+
+# Option profiles shared by the CLI and the GUI
+SEARCH_OPTS = {"quiet": True, "skip_download": True, "extract_flat": "in_playlist"}
+METADATA_OPTS = {"quiet": True, "skip_download": True, "noplaylist": True}
+# Lists every video of a playlist/channel in one request, without resolving each video
+FLAT_OPTS = {"quiet": True, "skip_download": True, "extract_flat": True}
+
+MAX_IDLE = 10   # idle instances kept per profile (matches MAX_CONCURRENT downloads)
+
+
+def download_opts(temp_dir: str, template: str = "%(title)s.%(ext)s") -> dict:
+    """
+    Download-only profile writing into temp_dir: best audio stream, no video. The mp3 conversion
+    runs afterwards in the pipeline's transcode stage (download_pipeline.extract_audio).
+    """
+    return {
+        "outtmpl": os.path.join(temp_dir, template),
+        "format": "bestaudio/best",
+        "noplaylist": True,   # a watch link with &list= is one video; whole lists are expanded into jobs first
+        "quiet": True,
+        "no_warnings": True,
+        "noprogress": True,
+    }
+
+
+class _Worker:
+    """One long-lived YoutubeDL. Its hooks forward to whatever the current job registered."""
+
+    def __init__(self, opts: dict):
+        self.progress_hooks = []
+        self.postprocessor_hooks = []
+        self.ydl = YoutubeDL(dict(
+            opts,
+            progress_hooks=[self._on_progress],
+            postprocessor_hooks=[self._on_postprocess],
+        ))
+
+    def _on_progress(self, d):
+        for hook in self.progress_hooks:
+            hook(d)
+
+    def _on_postprocess(self, d):
+        for hook in self.postprocessor_hooks:
+            hook(d)
+
+    def close(self):
+        try:
+            self.ydl.__exit__(None, None, None)   # saves cookies, closes the HTTP handlers
+        except Exception:
+            pass
+
+
+class YoutubeDLPool:
+    """
+    Keeps YoutubeDL instances alive between calls, one idle list per option profile, so
+    extractors, the cookie jar and keep-alive connections are set up once instead of per call.
+    An instance is used by one job at a time:
+
+        with YDL_POOL.checkout(SEARCH_OPTS) as ydl:
+            info = ydl.extract_info(f"ytsearch5:{query}", download=False)
+    """
+
+    def __init__(self, max_idle: int = MAX_IDLE):
+        self.max_idle = max_idle
+        self._lock = threading.Lock()
+        self._idle: dict[str, list[_Worker]] = {}
+
+    @staticmethod
+    def _key(opts: dict) -> str:
+        return repr(sorted(opts.items()))
+
+    @contextmanager
+    def checkout(self, opts: dict, progress_hooks=(), postprocessor_hooks=()):
+        key = self._key(opts)
+        with self._lock:
+            idle = self._idle.get(key)
+            worker = idle.pop() if idle else None
+        if worker is None:
+            worker = _Worker(opts)
+
+        worker.progress_hooks = list(progress_hooks)
+        worker.postprocessor_hooks = list(postprocessor_hooks)
+        try:
+            yield worker.ydl
+        finally:
+            worker.progress_hooks = []
+            worker.postprocessor_hooks = []
+            with self._lock:
+                idle = self._idle.setdefault(key, [])
+                if len(idle) < self.max_idle:
+                    idle.append(worker)
+                    worker = None
+            if worker is not None:
+                worker.close()
+
+    def close(self):
+        with self._lock:
+            workers = [w for idle in self._idle.values() for w in idle]
+            self._idle.clear()
+        for w in workers:
+            w.close()
+
+
+YDL_POOL = YoutubeDLPool()
+atexit.register(YDL_POOL.close)